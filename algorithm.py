@@ -1,83 +1,462 @@
+import argparse
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
 import pandas as pd
 import numpy as np
 
-def calculate_survival_match(land_data, animal_data):
+from datasets import load_dataset, save_dataset, write_chunks
+from scoring import DEFAULT_CRITERIA, compile_criteria
+
+# Define the criteria to check, see scoring.DEFAULT_CRITERIA
+CRITERIA = DEFAULT_CRITERIA
+
+def compute_criteria_masks(land_data, animal_data, criteria=None):
+    """
+    Build the animal x location matrix of criteria bitmasks.
+
+    Parameters:
+    land_data (DataFrame): Land geographical data
+    animal_data (DataFrame): Animal survival condition data
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
+    Returns:
+    ndarray: Bitmasks (bit c set when criterion c matched), rows follow
+    animal_data and columns land_data
+    """
+    plan = compile_criteria(criteria)
+    return plan.masks(plan.land_values(land_data), *plan.animal_ranges(animal_data))
+
+# Shared-memory arrays attached by each worker of the parallel scoring pool
+_shared_arrays = {}
+
+def _share_array(array):
+    """Copy an array into a new shared memory block."""
+    shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm
+
+def _attach_shared_arrays(specs):
+    """Pool initializer: map the shared input and output arrays into this worker."""
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shared_arrays[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+def _score_shared_slice(start, stop, plan):
+    """Pool task: score one slice of locations straight into the shared score matrix."""
+    land_values = _shared_arrays["land_values"][1][:, start:stop]
+    animal_min = _shared_arrays["animal_min"][1]
+    animal_max = _shared_arrays["animal_max"][1]
+    _shared_arrays["scores"][1][:, start:stop] = plan.scores(land_values, animal_min, animal_max)
+
+def _parallel_scores(plan, land_values, animal_min, animal_max, workers):
+    """
+    Score the location axis in slices on a process pool.
+
+    Inputs and the output matrix live in shared memory, so workers neither
+    receive pickled copies of the data nor send their results back. Every
+    slice writes its own columns, which keeps the merged matrix deterministic.
+    The returned matrix is the shared output block itself, it is released
+    once the matrix is garbage collected.
+    """
+    n_animals, n_locations = animal_min.shape[1], land_values.shape[1]
+    blocks = {
+        "land_values": _share_array(land_values),
+        "animal_min": _share_array(animal_min),
+        "animal_max": _share_array(animal_max),
+        # New shared memory is zero-filled, so the output needs no initial copy
+        "scores": shared_memory.SharedMemory(create=True, size=max(1, n_animals * n_locations * 8))
+    }
+    scores = np.ndarray((n_animals, n_locations), buffer=blocks["scores"].buf)
+    specs = {name: (shm.name, shape, np.float64) for (name, shm), shape in zip(
+        blocks.items(),
+        [land_values.shape, animal_min.shape, animal_max.shape, (n_animals, n_locations)]
+    )}
+
+    try:
+        # A few slices per worker keeps the pool busy when slices finish unevenly
+        bounds = np.linspace(0, n_locations, min(n_locations, workers * 4) + 1).astype(int)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_arrays,
+                                 initargs=(specs,)) as pool:
+            tasks = [pool.submit(_score_shared_slice, start, stop, plan)
+                     for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+            for task in tasks:
+                task.result()
+    except BaseException:
+        del scores
+        blocks["scores"].close()
+        raise
+    finally:
+        for name, shm in blocks.items():
+            # Unlinking only drops the name, the mapping stays valid until closed
+            shm.unlink()
+            if name != "scores":
+                shm.close()
+
+    weakref.finalize(scores, blocks["scores"].close)
+    return scores
+
+def compute_score_matrix(land_data, animal_data, criteria=None, workers=1):
+    """
+    Build the animal x location match percentage matrix in one vectorized pass.
+
+    Parameters:
+    land_data (DataFrame): Land geographical data
+    animal_data (DataFrame): Animal survival condition data
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+    workers (int): Number of processes to split the location axis across
+
+    Returns:
+    ndarray: Unrounded match percentages, rows follow animal_data and columns land_data
+    """
+    plan = compile_criteria(criteria)
+    land_values = plan.land_values(land_data)
+    animal_min, animal_max = plan.animal_ranges(animal_data)
+    if workers > 1 and len(land_data) > 1:
+        return _parallel_scores(plan, land_values, animal_min, animal_max, workers)
+    return plan.scores(land_values, animal_min, animal_max)
+
+def _upsert_rows(frame, updates, key):
+    """
+    Replace rows of frame whose key appears in updates and append the others.
+
+    Returns:
+    tuple: (updated frame, positions of the replaced and appended rows)
+    """
+    frame = frame.reset_index(drop=True)
+    if updates is None or len(updates) == 0:
+        return frame, np.array([], dtype=int)
+
+    positions = pd.Index(frame[key]).get_indexer(updates[key])
+    existing = positions >= 0
+    updates = updates[frame.columns]
+
+    if existing.any():
+        frame = frame.copy()
+        for i, col in enumerate(frame.columns):
+            frame.iloc[positions[existing], i] = updates[col].to_numpy()[existing]
+
+    appended = updates[~existing]
+    if len(appended):
+        frame = pd.concat([frame, appended], ignore_index=True)
+
+    rows = np.concatenate([positions[existing], np.arange(len(frame) - len(appended), len(frame))])
+    return frame, rows
+
+def update_score_matrix(scores, land_data, animal_data, changed_animals=None, changed_locations=None,
+                        removed_animal_ids=(), removed_location_ids=(), criteria=None):
+    """
+    Update a score matrix after a few animal or location rows changed.
+
+    Only the rows of changed animals and the columns of changed locations are
+    rescored, so an edit costs O(A + L) scores instead of O(A x L). Edited rows
+    keep their position, new rows are appended. When no rows are added or
+    removed, scores is updated in place.
+
+    Parameters:
+    scores (ndarray): Previous score matrix for land_data and animal_data
+    land_data (DataFrame): Land data the previous matrix was computed for
+    animal_data (DataFrame): Animal data the previous matrix was computed for
+    changed_animals (DataFrame): New or edited animal rows, matched on animal_id
+    changed_locations (DataFrame): New or edited location rows, matched on location_id
+    removed_animal_ids (list): animal_id values to drop
+    removed_location_ids (list): location_id values to drop
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
+    Returns:
+    tuple: (scores, land_data, animal_data) for the new state; pass them to
+    results_frame for the long-form results
+    """
+    # Drop removed rows and columns
+    animal_keep = ~animal_data["animal_id"].isin(removed_animal_ids).to_numpy()
+    location_keep = ~land_data["location_id"].isin(removed_location_ids).to_numpy()
+    if not animal_keep.all() or not location_keep.all():
+        scores = scores[animal_keep][:, location_keep]
+        animal_data = animal_data[animal_keep]
+        land_data = land_data[location_keep]
+
+    animal_data, animal_rows = _upsert_rows(animal_data, changed_animals, "animal_id")
+    land_data, location_columns = _upsert_rows(land_data, changed_locations, "location_id")
+
+    # Make room for appended animals and locations
+    if scores.shape != (len(animal_data), len(land_data)):
+        grown = np.empty((len(animal_data), len(land_data)))
+        grown[:scores.shape[0], :scores.shape[1]] = scores
+        scores = grown
+
+    if len(animal_rows):
+        scores[animal_rows] = compute_score_matrix(land_data, animal_data.iloc[animal_rows], criteria)
+    if len(location_columns):
+        scores[:, location_columns] = compute_score_matrix(land_data.iloc[location_columns], animal_data, criteria)
+
+    return scores, land_data, animal_data
+
+def results_frame(scores, land_data, animal_data, threshold=70):
+    """
+    Turn a score matrix into the long-form match results DataFrame.
+
+    Parameters:
+    scores (ndarray): Unrounded match percentages of shape (A, L)
+    land_data (DataFrame): Land rows matching the score columns
+    animal_data (DataFrame): Animal rows matching the score rows
+    threshold (float): Minimum match percentage for an animal to survive
+
+    Returns:
+    DataFrame: One row per animal-location pair, animal by animal
+    """
+    n_animals, n_locations = scores.shape
+    match_percentage = scores.ravel()
+
+    # Rows are laid out animal by animal, in the same order as the nested loop
+    return pd.DataFrame({
+        "animal_id": np.repeat(animal_data["animal_id"].to_numpy(), n_locations),
+        "animal_name": np.repeat(animal_data["animal_name"].to_numpy(), n_locations),
+        "location_id": np.tile(land_data["location_id"].to_numpy(), n_animals),
+        "location_name": np.tile(land_data["location_name"].to_numpy(), n_animals),
+        "match_percentage": match_percentage.round(2),
+        # Determine if the animal can survive based on the threshold
+        "can_survive": np.where(match_percentage >= threshold, "Yes", "No")
+    })
+
+def calculate_survival_match(land_data, animal_data, threshold=70, workers=1, criteria=None):
     """
     Calculate if an animal can survive in a location based on geographical compatibility.
     Returns a DataFrame with match percentages and survival predictions.
-    
+
     Parameters:
     land_data (DataFrame): Land geographical data
     animal_data (DataFrame): Animal survival condition data
-    
+    threshold (float): Minimum match percentage for an animal to survive
+    workers (int): Number of processes to score with, 1 scores in-process
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
     Returns:
     DataFrame: Match results with survival predictions
     """
     # Load the data
     # land_data = pd.read_csv('land_geographical_data.csv')
     # animal_data = pd.read_csv('animal_survival_conditions.csv')
-    
-    # Create an empty DataFrame for results
-    results = []
-    
-    # Define the criteria to check
-    criteria = [
-        # Criterion name, land column, animal min column, animal max column, weight
-        ("Temperature", "avg_temperature_c", "min_temperature_c", "max_temperature_c", 0.15),
-        ("Rainfall", "annual_rainfall_mm", "min_rainfall_mm", "max_rainfall_mm", 0.15),
-        ("Elevation", "elevation_m", "min_elevation_m", "max_elevation_m", 0.10),
-        ("Humidity", "humidity_percent", "min_humidity_percent", "max_humidity_percent", 0.10),
-        ("Vegetation", "vegetation_density", "min_vegetation_density", "max_vegetation_density", 0.15),
-        ("Water", "water_availability", "min_water_availability", "max_water_availability", 0.15),
-        ("Soil", "soil_quality", "min_soil_quality", "max_soil_quality", 0.10),
-        ("Predators", "predator_density", None, "max_predator_density", 0.10)
-    ]
-    
-    # For each animal and each location, calculate the compatibility
-    for _, animal in animal_data.iterrows():
-        for _, location in land_data.iterrows():
-            matches = {}
-            total_weight = 0
-            weighted_match_sum = 0
-            
-            for name, land_col, min_col, max_col, weight in criteria:
-                if min_col is None:  # For predator density, only check max
-                    matches[name] = 1 if location[land_col] <= animal[max_col] else 0
-                else:
-                    matches[name] = 1 if (animal[min_col] <= location[land_col] <= animal[max_col]) else 0
-                
-                weighted_match_sum += matches[name] * weight
-                total_weight += weight
-            
-            # Calculate overall match percentage
-            match_percentage = (weighted_match_sum / total_weight) * 100
-            
-            # Determine if the animal can survive based on the 70% threshold
-            can_survive = "Yes" if match_percentage >= 70 else "No"
-            
-            # Add to results
-            results.append({
-                "animal_id": animal["animal_id"],
-                "animal_name": animal["animal_name"],
-                "location_id": location["location_id"],
-                "location_name": location["location_name"],
-                "match_percentage": round(match_percentage, 2),
-                "can_survive": can_survive
-            })
-    
-    # Create a DataFrame from the results
-    results_df = pd.DataFrame(results)
-    
+
+    # Score every animal against every location at once
+    scores = compute_score_matrix(land_data, animal_data, criteria, workers)
+    results_df = results_frame(scores, land_data, animal_data, threshold)
+
     # Sort by animal and then by match percentage (descending)
     results_df = results_df.sort_values(by=["animal_name", "match_percentage"], ascending=[True, False])
-    
+
     return results_df
 
+def _location_blocks(land_data, block_size):
+    """Split a land DataFrame, or an iterable of DataFrame chunks, into blocks."""
+    chunks = [land_data] if isinstance(land_data, pd.DataFrame) else land_data
+    for chunk in chunks:
+        for start in range(0, len(chunk), block_size):
+            yield chunk.iloc[start:start + block_size]
+
+def iter_survival_match(land_data, animal_data, threshold=70, chunk_size=1_000_000, criteria=None):
+    """
+    Score location blocks against all animals and yield the results chunk by chunk.
+
+    Only one block of results is held in memory at a time, so peak memory is
+    bounded by chunk_size rather than by the number of animal-location pairs.
+    Chunks are not sorted against each other; within a chunk rows are laid out
+    animal by animal.
+
+    Parameters:
+    land_data (DataFrame or iterable): Land data, or an iterable of DataFrame chunks
+        such as pd.read_csv(..., chunksize=...)
+    animal_data (DataFrame): Animal survival condition data
+    threshold (float): Minimum match percentage for an animal to survive
+    chunk_size (int): Maximum number of result rows per yielded chunk
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
+    Yields:
+    DataFrame: Match results for one block of locations
+    """
+    plan = compile_criteria(criteria)
+    animal_min, animal_max = plan.animal_ranges(animal_data)
+    block_size = max(1, chunk_size // max(1, len(animal_data)))
+
+    for block in _location_blocks(land_data, block_size):
+        scores = plan.scores(plan.land_values(block), animal_min, animal_max)
+        yield results_frame(scores, block, animal_data, threshold)
+
+def write_survival_match(land_data, animal_data, path, threshold=70, chunk_size=1_000_000, criteria=None):
+    """
+    Stream match results straight to a CSV or Parquet file.
+
+    The output format follows the file extension: .parquet writes Parquet
+    (requires pyarrow), .csv.gz writes gzip-compressed CSV and anything else
+    plain CSV. Results are written chunk by chunk, see iter_survival_match.
+
+    Parameters:
+    land_data (DataFrame or iterable): Land data, or an iterable of DataFrame chunks
+    animal_data (DataFrame): Animal survival condition data
+    path (str): Output file path
+    threshold (float): Minimum match percentage for an animal to survive
+    chunk_size (int): Maximum number of result rows held in memory at once
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
+    Returns:
+    int: Number of result rows written
+    """
+    chunks = iter_survival_match(land_data, animal_data, threshold, chunk_size, criteria)
+    return write_chunks(chunks, path, "parquet" if str(path).endswith(".parquet") else "csv")
+
+# Ties between equal match percentages are broken by position, earlier first.
+# Rank keys pack both into one int64: rounded percentage * _TIE_RANGE - position.
+_TIE_RANGE = 1 << 40
+
+def _rank_keys(scores, positions, axis):
+    """Build unique integer ranking keys for a block of scores."""
+    rounded = np.rint(scores * 100).astype(np.int64)
+    return rounded * _TIE_RANGE - np.expand_dims(positions, 1 - axis)
+
+def _top_k(keys, k, axis):
+    """Return the indices of the k largest keys along an axis, best first."""
+    k = min(k, keys.shape[axis])
+    top = np.argpartition(-keys, k - 1, axis=axis)
+    top = top[:, :k] if axis == 1 else top[:k]
+    order = np.argsort(-np.take_along_axis(keys, top, axis=axis), axis=axis)
+    return np.take_along_axis(top, order, axis=axis)
+
+def top_k_indices(scores, k=1, axis=1):
+    """
+    Positions of the k best scores along an axis, using partial selection.
+
+    Scores are ranked by their rounded match percentage and ties are broken
+    by position, the earlier one wins.
+
+    Parameters:
+    scores (ndarray): Match percentages of shape (A, L)
+    k (int): Number of positions to select
+    axis (int): 1 for the best locations per animal, 0 for the best animals per location
+
+    Returns:
+    ndarray: Selected positions along the axis, best first
+    """
+    positions = np.arange(scores.shape[axis])
+    return _top_k(_rank_keys(scores, positions, axis), k, axis)
+
+def top_locations_per_animal(land_data, animal_data, k=1, threshold=70, chunk_size=1_000_000, criteria=None):
+    """
+    Find the k best locations for every animal without building all A x L rows.
+
+    Locations are scored block by block and only a running top-k per animal is
+    kept, selected with np.argpartition instead of a full sort. Ties are broken
+    like the sorted calculate_survival_match output: the earlier location wins.
+
+    Parameters:
+    land_data (DataFrame or iterable): Land data, or an iterable of DataFrame chunks
+    animal_data (DataFrame): Animal survival condition data
+    k (int): Number of locations to return per animal
+    threshold (float): Minimum match percentage for an animal to survive
+    chunk_size (int): Maximum number of scores held in memory at once
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
+    Returns:
+    DataFrame: k rows per animal in animal_data order, with a rank column
+    """
+    plan = compile_criteria(criteria)
+    animal_min, animal_max = plan.animal_ranges(animal_data)
+    block_size = max(1, chunk_size // max(1, len(animal_data)))
+
+    best = None
+    offset = 0
+    for block in _location_blocks(land_data, block_size):
+        scores = plan.scores(plan.land_values(block), animal_min, animal_max)
+        keys = _rank_keys(scores, np.arange(offset, offset + len(block)), axis=1)
+        candidates = (
+            keys,
+            scores,
+            np.broadcast_to(block["location_id"].to_numpy(), scores.shape),
+            np.broadcast_to(block["location_name"].to_numpy(), scores.shape)
+        )
+        if best is not None:
+            candidates = tuple(np.hstack([kept, new]) for kept, new in zip(best, candidates))
+        top = _top_k(candidates[0], k, axis=1)
+        best = tuple(np.take_along_axis(values, top, axis=1) for values in candidates)
+        offset += len(block)
+
+    if best is None:
+        return pd.DataFrame(columns=["animal_id", "animal_name", "location_id", "location_name",
+                                     "match_percentage", "can_survive", "rank"])
+
+    _, scores, location_ids, location_names = best
+    n_animals, n_top = scores.shape
+    return pd.DataFrame({
+        "animal_id": np.repeat(animal_data["animal_id"].to_numpy(), n_top),
+        "animal_name": np.repeat(animal_data["animal_name"].to_numpy(), n_top),
+        "location_id": location_ids.ravel(),
+        "location_name": location_names.ravel(),
+        "match_percentage": scores.ravel().round(2),
+        "can_survive": np.where(scores.ravel() >= threshold, "Yes", "No"),
+        "rank": np.tile(np.arange(1, n_top + 1), n_animals)
+    })
+
+def top_animals_per_location(land_data, animal_data, k=1, threshold=70, chunk_size=1_000_000, criteria=None):
+    """
+    Find the k best-suited animals for every location.
+
+    Each block of locations is scored against all animals and reduced to its
+    top k with np.argpartition before the next block is scored. Ties are
+    broken by animal order, the earlier animal wins.
+
+    Parameters:
+    land_data (DataFrame or iterable): Land data, or an iterable of DataFrame chunks
+    animal_data (DataFrame): Animal survival condition data
+    k (int): Number of animals to return per location
+    threshold (float): Minimum match percentage for an animal to survive
+    chunk_size (int): Maximum number of scores held in memory at once
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
+    Returns:
+    DataFrame: k rows per location in land_data order, with a rank column
+    """
+    plan = compile_criteria(criteria)
+    animal_min, animal_max = plan.animal_ranges(animal_data)
+    block_size = max(1, chunk_size // max(1, len(animal_data)))
+    animal_ids = animal_data["animal_id"].to_numpy()
+    animal_names = animal_data["animal_name"].to_numpy()
+
+    frames = []
+    for block in _location_blocks(land_data, block_size):
+        scores = plan.scores(plan.land_values(block), animal_min, animal_max)
+        top = top_k_indices(scores, k, axis=0)
+        top_scores = np.take_along_axis(scores, top, axis=0).T.ravel()
+        top_animals = top.T.ravel()
+        n_top = top.shape[0]
+        frames.append(pd.DataFrame({
+            "location_id": np.repeat(block["location_id"].to_numpy(), n_top),
+            "location_name": np.repeat(block["location_name"].to_numpy(), n_top),
+            "animal_id": animal_ids[top_animals],
+            "animal_name": animal_names[top_animals],
+            "match_percentage": top_scores.round(2),
+            "can_survive": np.where(top_scores >= threshold, "Yes", "No"),
+            "rank": np.tile(np.arange(1, n_top + 1), len(block))
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=["location_id", "location_name", "animal_id", "animal_name",
+                                     "match_percentage", "can_survive", "rank"])
+
+    return pd.concat(frames, ignore_index=True)
+
 # Example usage:
 if __name__ == "__main__":
-    # Load the datasets
-    land_data = pd.read_csv('land_geographical_data.csv')
-    animal_data = pd.read_csv('animal_survival_conditions.csv')
+    parser = argparse.ArgumentParser(description="Predict animal survival for every location")
+    parser.add_argument("--land", default="land_geographical_data.csv",
+                        help="Land dataset: .csv, .parquet or a .npy column directory")
+    parser.add_argument("--animals", default="animal_survival_conditions.csv",
+                        help="Animal dataset: .csv, .parquet or a .npy column directory")
+    parser.add_argument("--output", default="animal_survival_predictions.csv",
+                        help="Predictions output: .csv, .parquet or a .npy column directory")
+    args = parser.parse_args()
+
+    # Load the datasets, binary formats are memory-mapped
+    land_data = load_dataset(args.land)
+    animal_data = load_dataset(args.animals)
     
     # Calculate survival matches
     survival_results = calculate_survival_match(land_data, animal_data)
@@ -87,10 +466,9 @@ if __name__ == "__main__":
     
     # Show a summary of results
     print("\nBest habitat match for each animal:")
-    for animal in survival_results['animal_name'].unique():
-        animal_results = survival_results[survival_results['animal_name'] == animal]
-        best_match = animal_results.iloc[0]
-        print(f"{animal}: {best_match['location_name']} - {best_match['match_percentage']}% match ({best_match['can_survive']})")
+    best_matches = top_locations_per_animal(land_data, animal_data, k=1)
+    for _, best_match in best_matches.sort_values(by="animal_name", kind="stable").iterrows():
+        print(f"{best_match['animal_name']}: {best_match['location_name']} - {best_match['match_percentage']}% match ({best_match['can_survive']})")
     
-    # Save to CSV
-    survival_results.to_csv('animal_survival_predictions.csv', index=False)
\ No newline at end of file
+    # Save the predictions
+    save_dataset(survival_results, args.output)
\ No newline at end of file
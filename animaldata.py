@@ -1,6 +1,16 @@
+import argparse
+
 import pandas as pd
 import numpy as np
 
+from datasets import save_dataset
+from synthetic import order_ranges
+
+parser = argparse.ArgumentParser(description="Generate the animal survival conditions dataset")
+parser.add_argument("--format", choices=["csv", "npy", "parquet"], default="csv",
+                    help="Output format: CSV, one .npy file per column, or Parquet")
+args = parser.parse_args()
+
 # Set random seed for reproducibility
 np.random.seed(43)
 
@@ -33,11 +43,7 @@ animal_data = pd.DataFrame({
 })
 
 # Ensure max values are greater than min values
-for col in animal_data.columns:
-    if col.startswith('min_') and f'max_{col[4:]}' in animal_data.columns:
-        for idx in animal_data.index:
-            if animal_data.loc[idx, col] > animal_data.loc[idx, f'max_{col[4:]}']:
-                animal_data.loc[idx, [col, f'max_{col[4:]}']] = animal_data.loc[idx, [f'max_{col[4:]}', col]].values
+order_ranges(animal_data)
 
 # Adjust values to match typical animal requirements
 animal_data.loc[animal_data['animal_name'] == 'Snow Leopard', 'max_temperature_c'] = np.random.uniform(15, 25, 1)[0].round(1)
@@ -48,5 +54,6 @@ animal_data.loc[animal_data['animal_name'] == 'Penguin', 'max_temperature_c'] =
 print("\nAnimal Survival Geographical Conditions:")
 print(animal_data)
 
-# Save to CSV
-animal_data.to_csv('animal_survival_conditions.csv', index=False)
\ No newline at end of file
+# Save to CSV, or to a binary columnar dataset that loads memory-mapped
+output_paths = {"csv": 'animal_survival_conditions.csv', "npy": 'animal_survival_conditions', "parquet": 'animal_survival_conditions.parquet'}
+save_dataset(animal_data, output_paths[args.format])
\ No newline at end of file
@@ -5,11 +5,44 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
-from io import StringIO
+from io import StringIO, BytesIO
+import hashlib
+import os
+import tempfile
+
+import algorithm
+import datasets
+import heatmap
+import scoring
+import sweeps
+from synthetic import order_ranges
+
+# Compiled criteria used by every scoring call in the app
+SCORING_PLAN = scoring.DEFAULT_PLAN
+
+# Seeds of the default datasets, also used as their cache keys
+LAND_SEED = 42
+ANIMAL_SEED = 43
+
+# Maximum number of datasets kept by each cache; least recently used entries are evicted
+CACHE_MAX_ENTRIES = 8
+
+# Heatmaps with more cells than this are drawn without cell labels
+HEATMAP_TEXT_CELLS = 400
+
+# Rows serialized at a time when building an export
+EXPORT_CHUNK_ROWS = 100_000
+
+# Export format -> (datasets.write_chunks format, compression, file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV (gzip)": ("csv", "gzip", ".csv.gz", "application/gzip"),
+    "Parquet": ("parquet", None, ".parquet", "application/vnd.apache.parquet")
+}
 
 # Function to generate land geographical data
-def generate_land_data():
-    np.random.seed(42)
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def generate_land_data(seed=LAND_SEED):
+    np.random.seed(seed)
     
     locations = [
         "Alpine Forest", "Coastal Beach", "Desert", "Grassland Prairie", 
@@ -40,8 +73,9 @@ def generate_land_data():
     return land_data
 
 # Function to generate animal survival conditions data
-def generate_animal_data():
-    np.random.seed(43)
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def generate_animal_data(seed=ANIMAL_SEED):
+    np.random.seed(seed)
     
     animals = [
         "Snow Leopard", "Camel", "Jaguar", "Kangaroo", 
@@ -70,11 +104,7 @@ def generate_animal_data():
     })
     
     # Ensure max values are greater than min values
-    for col in animal_data.columns:
-        if col.startswith('min_') and f'max_{col[4:]}' in animal_data.columns:
-            for idx in animal_data.index:
-                if animal_data.loc[idx, col] > animal_data.loc[idx, f'max_{col[4:]}']:
-                    animal_data.loc[idx, [col, f'max_{col[4:]}']] = animal_data.loc[idx, [f'max_{col[4:]}', col]].values
+    order_ranges(animal_data)
     
     # Adjust values to match typical animal requirements
     animal_data.loc[animal_data['animal_name'] == 'Snow Leopard', 'max_temperature_c'] = np.random.uniform(15, 25, 1)[0].round(1)
@@ -84,81 +114,136 @@ def generate_animal_data():
     
     return animal_data
 
-# Function to calculate survival match
-def calculate_survival_match(land_data, animal_data, threshold=70):
+# Function to parse an uploaded CSV file, cached by the hash of its bytes
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def load_csv(digest, _raw_bytes):
+    return pd.read_csv(BytesIO(_raw_bytes))
+
+# Function to score every animal-location pair
+def _score_survival_match(land_data, animal_data):
     """
-    Calculate if an animal can survive in a location based on geographical compatibility.
-    Returns a DataFrame with match percentages and survival predictions.
+    Score every animal-location pair independently of the survival threshold.
+    Returns the sorted results and each animal's best match, both without
+    the can_survive column, see apply_threshold, and the criteria bitmask
+    matrix of shape (animals, locations).
+    
+    Per-criterion results are kept as a uint8 bitmask in the criteria_mask
+    column (bit i set when criterion i matched), see build_criteria_details.
     """
-    # Create an empty list for results
-    results = []
-    
-    # Define the criteria to check with weights
-    criteria = [
-        # Criterion name, land column, animal min column, animal max column, weight
-        ("Temperature", "avg_temperature_c", "min_temperature_c", "max_temperature_c", 0.15),
-        ("Rainfall", "annual_rainfall_mm", "min_rainfall_mm", "max_rainfall_mm", 0.15),
-        ("Elevation", "elevation_m", "min_elevation_m", "max_elevation_m", 0.10),
-        ("Humidity", "humidity_percent", "min_humidity_percent", "max_humidity_percent", 0.10),
-        ("Vegetation", "vegetation_density", "min_vegetation_density", "max_vegetation_density", 0.15),
-        ("Water", "water_availability", "min_water_availability", "max_water_availability", 0.15),
-        ("Soil", "soil_quality", "min_soil_quality", "max_soil_quality", 0.10),
-        ("Predators", "predator_density", None, "max_predator_density", 0.10)
-    ]
+    # Score all pairs with the vectorized engine
+    land_values = SCORING_PLAN.land_values(land_data)
+    animal_min, animal_max = SCORING_PLAN.animal_ranges(animal_data)
+    masks = SCORING_PLAN.masks(land_values, animal_min, animal_max)
+    scores = SCORING_PLAN.mask_scores(masks)
     
-    # For each animal and each location, calculate the compatibility
-    for _, animal in animal_data.iterrows():
-        for _, location in land_data.iterrows():
-            matches = {}
-            criteria_results = {}
-            total_weight = 0
-            weighted_match_sum = 0
-            
-            for name, land_col, min_col, max_col, weight in criteria:
-                if min_col is None:  # For predator density, only check max
-                    matches[name] = 1 if location[land_col] <= animal[max_col] else 0
-                    criteria_results[name] = {
-                        "location_value": location[land_col],
-                        "animal_max": animal[max_col],
-                        "match": matches[name]
-                    }
-                else:
-                    matches[name] = 1 if (animal[min_col] <= location[land_col] <= animal[max_col]) else 0
-                    criteria_results[name] = {
-                        "location_value": location[land_col],
-                        "animal_min": animal[min_col],
-                        "animal_max": animal[max_col],
-                        "match": matches[name]
-                    }
-                
-                weighted_match_sum += matches[name] * weight
-                total_weight += weight
-            
-            # Calculate overall match percentage
-            match_percentage = (weighted_match_sum / total_weight) * 100
-            
-            # Determine if the animal can survive based on the threshold
-            can_survive = "Yes" if match_percentage >= threshold else "No"
-            
-            # Add to results
-            results.append({
-                "animal_id": animal["animal_id"],
-                "animal_name": animal["animal_name"],
-                "location_id": location["location_id"],
-                "location_name": location["location_name"],
-                "match_percentage": round(match_percentage, 2),
-                "can_survive": can_survive,
-                "criteria_details": criteria_results
-            })
-    
-    # Create a DataFrame from the results
-    results_df = pd.DataFrame(results)
+    # The result index is the pair position in the animal-major layout
+    results_df = algorithm.results_frame(scores, land_data, animal_data).drop(columns="can_survive")
+    results_df["criteria_mask"] = masks.ravel()
+    
+    # Best location per animal by partial selection on the score matrix
+    best_locations = algorithm.top_k_indices(scores, k=1)[:, 0]
+    best_df = results_df.loc[np.arange(len(animal_data)) * len(land_data) + best_locations]
+    best_df = best_df.sort_values(by="animal_name", kind="stable")
     
     # Sort by animal and then by match percentage (descending)
     results_df = results_df.sort_values(by=["animal_name", "match_percentage"], ascending=[True, False])
     
+    return results_df, best_df, masks
+
+# Function to score a dataset once, cached by its content key
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, show_spinner="Scoring animal-location pairs...")
+def score_survival_match(dataset_key, _land_data, _animal_data):
+    """
+    Cached _score_survival_match. dataset_key identifies the data (upload
+    hashes or generator seeds), so the frames themselves are never hashed.
+    The cached frames are shared between sessions and must not be modified.
+    """
+    return _score_survival_match(_land_data, _animal_data)
+
+# Function to derive survival predictions for a threshold
+def apply_threshold(scored_results, threshold, keep_mask=True):
+    """
+    Add the can_survive column to scored results without rescoring them.
+    The unrounded match percentage is recovered from the criteria bitmask.
+    """
+    match_percentage = SCORING_PLAN.mask_scores(scored_results['criteria_mask'].to_numpy())
+    
+    results_df = scored_results.copy() if keep_mask else scored_results.drop(columns=['criteria_mask'])
+    results_df.insert(
+        results_df.columns.get_loc("match_percentage") + 1,
+        "can_survive",
+        np.where(match_percentage >= threshold, "Yes", "No")
+    )
     return results_df
 
+# Function to build the survival predictions table, once per dataset and threshold
+@st.cache_resource(max_entries=2)
+def build_survival_view(dataset_key, threshold, _scored_results):
+    return apply_threshold(_scored_results, threshold, keep_mask=False)
+
+# Function to calculate survival match
+def calculate_survival_match(land_data, animal_data, threshold=70):
+    """
+    Calculate if an animal can survive in a location based on geographical compatibility.
+    Returns a DataFrame with match percentages and survival predictions.
+    """
+    scored_results, _, _ = _score_survival_match(land_data, animal_data)
+    return apply_threshold(scored_results, threshold)
+
+# Function to map animal and location names to score matrix positions, once per dataset
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def build_name_index(dataset_key, _animal_data, _land_data):
+    """
+    Map every animal name to its rows of animal_data and every location name
+    to its rows of land_data. The rows are the row and column positions in
+    the criteria bitmask matrix.
+    """
+    return (
+        _animal_data.groupby('animal_name', sort=False).indices,
+        _land_data.groupby('location_name', sort=False).indices
+    )
+
+# Function to map pair positions to rows of the sorted results, once per dataset
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def build_pair_rows(dataset_key, _scored_results):
+    """
+    Invert the sort of the scored results: entry animal_idx * n_locations +
+    location_idx is the row of that pair, for iloc lookups without scans.
+    """
+    pair_rows = np.empty(len(_scored_results), dtype=np.int64)
+    pair_rows[_scored_results.index.to_numpy()] = np.arange(len(_scored_results))
+    return pair_rows
+
+# Function to look up one animal-location pair in the criteria bitmask matrix
+def lookup_pair(criteria_masks, animal_idx, location_idx, threshold):
+    criteria_mask = criteria_masks[animal_idx, location_idx]
+    match_percentage = SCORING_PLAN.mask_scores(criteria_mask)
+    return {
+        "match_percentage": np.round(match_percentage, 2),
+        "can_survive": "Yes" if match_percentage >= threshold else "No",
+        "criteria_mask": criteria_mask
+    }
+
+# Function to rebuild the per-criterion details of one animal-location pair
+def build_criteria_details(animal, location, criteria_mask):
+    criteria_results = {}
+    for i, (name, land_col, min_col, max_col, weight) in enumerate(SCORING_PLAN.criteria):
+        match = (int(criteria_mask) >> i) & 1
+        if min_col is None:  # For predator density, only check max
+            criteria_results[name] = {
+                "location_value": location[land_col],
+                "animal_max": animal[max_col],
+                "match": match
+            }
+        else:
+            criteria_results[name] = {
+                "location_value": location[land_col],
+                "animal_min": animal[min_col],
+                "animal_max": animal[max_col],
+                "match": match
+            }
+    return criteria_results
+
 # Function to create a radar chart for animal-location match
 def create_radar_chart(animal_name, location_name, criteria_details):
     categories = list(criteria_details.keys())
@@ -186,18 +271,22 @@ def create_radar_chart(animal_name, location_name, criteria_details):
     
     return fig
 
-# Function to create a heatmap of all animals vs all locations
-def create_heatmap(survival_results):
-    # Pivot the results to create a matrix of animals vs locations
-    heatmap_data = survival_results.pivot_table(
-        index='animal_name', 
-        columns='location_name', 
-        values='match_percentage'
-    )
-    
+# Function to aggregate the score matrix into a bounded heatmap, once per dataset and region
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES * 4)
+def build_heatmap(dataset_key, _masks, _animal_names, _location_names, order, row_range, col_range):
+    """
+    Cached heatmap.heatmap_view of the scored dataset. The matrix is built
+    from the criteria bitmasks, so no pivot of the long results is needed.
+    """
+    scores = SCORING_PLAN.mask_scores(_masks)
+    return heatmap.heatmap_view(scores, _animal_names, _location_names, order, row_range, col_range)
+
+# Function to create a heatmap of animals vs locations
+def create_heatmap(heatmap_data):
+    # Cell labels are only readable, and cheap to render, on small heatmaps
     fig = px.imshow(
         heatmap_data,
-        text_auto='.1f',
+        text_auto='.1f' if heatmap_data.size <= HEATMAP_TEXT_CELLS else False,
         color_continuous_scale='viridis',
         title='Animal Survival Match Percentages by Location',
         labels={'color': 'Match %'}
@@ -206,6 +295,72 @@ def create_heatmap(survival_results):
     fig.update_layout(height=600)
     return fig
 
+# Function to compute survival statistics for every threshold, once per dataset
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES)
+def sweep_thresholds(dataset_key, _land_data, _animal_data, _masks):
+    return sweeps.threshold_sweep(_land_data, _animal_data, SCORING_PLAN, masks=_masks)
+
+# Function to create a chart of the survival rate at every threshold
+def create_survival_curve(curve, threshold):
+    fig = px.line(
+        curve,
+        x='threshold',
+        y='survival_rate',
+        line_shape='hv',
+        markers=True,
+        hover_data=['surviving_pairs', 'species_with_habitat', 'locations_with_species'],
+        title='Surviving Animal-Location Pairs by Threshold',
+        labels={'threshold': 'Threshold (%)', 'survival_rate': 'Surviving pairs (%)'}
+    )
+    fig.add_vline(x=threshold, line_dash='dash', annotation_text=f"Current threshold ({threshold}%)")
+    fig.update_layout(height=400)
+    return fig
+
+# Function to split a dataframe into export chunks
+def iter_frame_chunks(df):
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+# Function to derive the survival results export chunk by chunk
+def iter_results_export(scored_results, land_data, animal_data, threshold, include_details):
+    """
+    Yield the survival results export in chunks of EXPORT_CHUNK_ROWS rows.
+    With include_details every criterion adds the location value, the animal
+    range and a 0/1 match column, rebuilt per chunk from the criteria bitmask
+    and the source rows, so the full detail is never held in memory.
+    """
+    n_locations = len(land_data)
+    for chunk in iter_frame_chunks(scored_results):
+        criteria_mask = chunk['criteria_mask'].to_numpy()
+        match_percentage = SCORING_PLAN.mask_scores(criteria_mask)
+        export = pd.DataFrame({
+            'animal_name': chunk['animal_name'].to_numpy(),
+            'location_name': chunk['location_name'].to_numpy(),
+            'match_percentage': chunk['match_percentage'].to_numpy(),
+            'can_survive': np.where(match_percentage >= threshold, "Yes", "No")
+        })
+        if include_details:
+            animal_idx, location_idx = np.divmod(chunk.index.to_numpy(), n_locations)
+            for i, (name, land_col, min_col, max_col, weight) in enumerate(SCORING_PLAN.criteria):
+                export[land_col] = land_data[land_col].to_numpy()[location_idx]
+                if min_col is not None:
+                    export[min_col] = animal_data[min_col].to_numpy()[animal_idx]
+                export[max_col] = animal_data[max_col].to_numpy()[animal_idx]
+                export[f"{name.lower()}_match"] = (criteria_mask >> i) & 1
+        yield export
+
+# Function to serialize an export to a file chunk by chunk, so the export is never built in memory
+def build_export(path, export_name, export_format, threshold, include_details, land_data, animal_data, scored_results):
+    write_format, compression, _, _ = EXPORT_FORMATS[export_format]
+    if export_name == "Land Data":
+        chunks = iter_frame_chunks(land_data)
+    elif export_name == "Animal Data":
+        chunks = iter_frame_chunks(animal_data)
+    else:
+        chunks = iter_results_export(scored_results, land_data, animal_data, threshold, include_details)
+    
+    datasets.write_chunks(chunks, path, write_format, compression)
+
 # Main Streamlit app
 def main():
     st.set_page_config(layout="wide", page_title="Animal Survival Prediction")
@@ -237,8 +392,9 @@ def main():
     
     # Load data based on user selection
     if data_option == "Use default data":
-        land_data = generate_land_data()
-        animal_data = generate_animal_data()
+        land_data = generate_land_data(LAND_SEED)
+        animal_data = generate_animal_data(ANIMAL_SEED)
+        dataset_key = ("default", LAND_SEED, ANIMAL_SEED)
         st.sidebar.success("Using default data")
     else:
         st.sidebar.info("Upload your CSV files:")
@@ -247,92 +403,119 @@ def main():
         
         if land_file is not None and animal_file is not None:
             try:
-                land_data = pd.read_csv(land_file)
-                animal_data = pd.read_csv(animal_file)
+                # Uploads are cached by content, so reruns skip parsing
+                land_bytes = land_file.getvalue()
+                animal_bytes = animal_file.getvalue()
+                land_digest = hashlib.sha256(land_bytes).hexdigest()
+                animal_digest = hashlib.sha256(animal_bytes).hexdigest()
+                land_data = load_csv(land_digest, land_bytes)
+                animal_data = load_csv(animal_digest, animal_bytes)
+                dataset_key = ("upload", land_digest, animal_digest)
                 st.sidebar.success("Files uploaded successfully!")
             except Exception as e:
                 st.sidebar.error(f"Error: {e}")
                 st.stop()
         else:
             # Use default data if files not uploaded
-            land_data = generate_land_data()
-            animal_data = generate_animal_data()
+            land_data = generate_land_data(LAND_SEED)
+            animal_data = generate_animal_data(ANIMAL_SEED)
+            dataset_key = ("default", LAND_SEED, ANIMAL_SEED)
             st.sidebar.info("Using default data until both files are uploaded")
     
-    # Calculate results
-    survival_results = calculate_survival_match(land_data, animal_data, threshold)
+    # Calculate results, scoring is cached so threshold changes only re-derive can_survive
+    scored_results, scored_best, criteria_masks = score_survival_match(dataset_key, land_data, animal_data)
+    best_matches = apply_threshold(scored_best, threshold)
+    animal_index, location_index = build_name_index(dataset_key, animal_data, land_data)
     
-    # Download buttons in sidebar
+    # Download buttons in sidebar, exports are only serialized when requested
     st.sidebar.markdown("---")
     st.sidebar.header("Download Data")
     
-    # Function to convert dataframe to CSV download link
-    def get_download_link(df, filename):
-        csv = df.to_csv(index=False)
-        return csv
-    
-    land_csv = get_download_link(land_data, "land_data.csv")
-    animal_csv = get_download_link(animal_data, "animal_data.csv")
-    results_csv = get_download_link(survival_results[['animal_name', 'location_name', 'match_percentage', 'can_survive']], 
-                                  "survival_results.csv")
-    
-    st.sidebar.download_button(
-        label="Download Land Data",
-        data=land_csv,
-        file_name="land_geographical_data.csv",
-        mime="text/csv"
-    )
-    
-    st.sidebar.download_button(
-        label="Download Animal Data",
-        data=animal_csv,
-        file_name="animal_survival_conditions.csv",
-        mime="text/csv"
-    )
-    
-    st.sidebar.download_button(
-        label="Download Results",
-        data=results_csv,
-        file_name="animal_survival_predictions.csv",
-        mime="text/csv"
-    )
+    export_name = st.sidebar.selectbox("Data to download:", ["Land Data", "Animal Data", "Results"])
+    export_format = st.sidebar.radio("File format:", list(EXPORT_FORMATS))
+    include_details = False
+    if export_name == "Results":
+        include_details = st.sidebar.checkbox("Include per-criterion details")
+    
+    # The export is built only in the run where it is requested and is not cached; the
+    # download button hands the file to Streamlit, which drops it on the next rerun
+    if st.sidebar.button("Prepare download"):
+        _, _, extension, mime = EXPORT_FORMATS[export_format]
+        file_stems = {
+            "Land Data": "land_geographical_data",
+            "Animal Data": "animal_survival_conditions",
+            "Results": "animal_survival_predictions"
+        }
+        with tempfile.TemporaryDirectory() as export_dir:
+            export_path = os.path.join(export_dir, file_stems[export_name] + extension)
+            try:
+                with st.spinner("Preparing download..."):
+                    build_export(export_path, export_name, export_format, threshold, include_details,
+                                 land_data, animal_data, scored_results)
+            except ImportError as e:
+                st.sidebar.error(f"Error: {e}")
+            else:
+                with open(export_path, "rb") as export_file:
+                    st.sidebar.download_button(
+                        label=f"Download {export_name}",
+                        data=export_file,
+                        file_name=file_stems[export_name] + extension,
+                        mime=mime
+                    )
     
     # Main content area with tabs
     tab1, tab2, tab3, tab4 = st.tabs(["Overview", "Detailed Analysis", "Data Explorer", "About"])
     
     with tab1:
+        # Survival rate for every threshold, from one pass over the scored pairs
+        threshold_sweep = sweep_thresholds(dataset_key, land_data, animal_data, criteria_masks)
+        
         # Summary metrics
         col1, col2, col3 = st.columns(3)
-        total_matches = survival_results[survival_results['can_survive'] == 'Yes'].shape[0]
+        total_pairs = criteria_masks.size
+        total_matches = sweeps.surviving_pairs(threshold_sweep, threshold, SCORING_PLAN)
         
         col1.metric("Total Animal-Location Combinations", 
-                   f"{survival_results.shape[0]}")
+                   f"{total_pairs}")
         
         col2.metric("Successful Matches", 
-                   f"{total_matches} ({total_matches/survival_results.shape[0]*100:.1f}%)")
+                   f"{total_matches} ({total_matches/total_pairs*100:.1f}%)")
         
         col3.metric("Current Threshold", 
                    f"{threshold}%")
         
-        # Create heatmap
+        st.plotly_chart(create_survival_curve(threshold_sweep.curve, threshold), use_container_width=True)
+        
+        # Create heatmap, large matrices are averaged into blocks with drill-down by region
         st.subheader("Survival Match Heatmap")
-        st.plotly_chart(create_heatmap(survival_results), use_container_width=True)
+        n_animals, n_locations = criteria_masks.shape
+        heatmap_order = st.radio("Order animals and locations by:", ["name", "mean"], horizontal=True,
+                                 format_func={"name": "Name", "mean": "Best mean match"}.get)
+        row_range = col_range = None
+        if n_animals > heatmap.MAX_HEATMAP_ROWS or n_locations > heatmap.MAX_HEATMAP_COLS:
+            st.caption("Cells are averaged over blocks of animals and locations. Narrow the ranges to drill down.")
+            if n_animals > heatmap.MAX_HEATMAP_ROWS:
+                row_range = st.slider("Animals (in display order)", 0, n_animals, (0, n_animals))
+            if n_locations > heatmap.MAX_HEATMAP_COLS:
+                col_range = st.slider("Locations (in display order)", 0, n_locations, (0, n_locations))
+        if any(selected is not None and selected[1] <= selected[0] for selected in (row_range, col_range)):
+            st.info("Select at least one animal and one location to draw the heatmap.")
+        else:
+            heatmap_view = build_heatmap(
+                dataset_key, criteria_masks, animal_data['animal_name'].to_numpy(),
+                land_data['location_name'].to_numpy(), heatmap_order, row_range, col_range
+            )
+            st.plotly_chart(create_heatmap(heatmap_view.data), use_container_width=True)
         
         # Best habitats for each animal
         st.subheader("Best Habitat for Each Animal")
         
-        best_matches = []
-        for animal in survival_results['animal_name'].unique():
-            animal_results = survival_results[survival_results['animal_name'] == animal]
-            best_match = animal_results.iloc[0]
-            best_matches.append({
-                "Animal": animal,
-                "Best Location": best_match['location_name'],
-                "Match %": best_match['match_percentage'],
-                "Can Survive": best_match['can_survive']
-            })
-        
-        best_df = pd.DataFrame(best_matches)
+        best_df = pd.DataFrame({
+            "Animal": best_matches['animal_name'].to_numpy(),
+            "Best Location": best_matches['location_name'].to_numpy(),
+            "Match %": best_matches['match_percentage'].to_numpy(),
+            "Can Survive": best_matches['can_survive'].to_numpy()
+        })
         best_df['Match %'] = best_df['Match %'].round(1)
         
         # Color the dataframe
@@ -351,15 +534,19 @@ def main():
         # Animal and location selectors
         col1, col2 = st.columns(2)
         with col1:
-            selected_animal = st.selectbox("Select Animal", options=sorted(animal_data['animal_name'].unique()))
+            selected_animal = st.selectbox("Select Animal", options=sorted(animal_index))
         with col2:
-            selected_location = st.selectbox("Select Location", options=sorted(land_data['location_name'].unique()))
+            selected_location = st.selectbox("Select Location", options=sorted(location_index))
         
-        # Get match details
-        match_row = survival_results[
-            (survival_results['animal_name'] == selected_animal) & 
-            (survival_results['location_name'] == selected_location)
-        ].iloc[0]
+        # Get match details straight from the matrix, without scanning the results
+        animal_idx = animal_index[selected_animal][0]
+        location_idx = location_index[selected_location][0]
+        match_row = lookup_pair(criteria_masks, animal_idx, location_idx, threshold)
+        
+        # Rebuild the criteria details from the source rows
+        criteria_details = build_criteria_details(
+            animal_data.iloc[animal_idx], land_data.iloc[location_idx], match_row['criteria_mask']
+        )
         
         # Display match percentage and survival status
         col1, col2 = st.columns(2)
@@ -369,13 +556,13 @@ def main():
         col2.markdown(f"### Survival: <span style='color:{match_color}'>{match_row['can_survive']}</span>", unsafe_allow_html=True)
         
         # Display radar chart
-        st.plotly_chart(create_radar_chart(selected_animal, selected_location, match_row['criteria_details']), use_container_width=True)
+        st.plotly_chart(create_radar_chart(selected_animal, selected_location, criteria_details), use_container_width=True)
         
         # Display detailed criteria matching
         st.subheader("Detailed Criteria Analysis")
         
         criteria_data = []
-        for criterion, details in match_row['criteria_details'].items():
+        for criterion, details in criteria_details.items():
             if "animal_min" in details:
                 criteria_data.append({
                     "Criterion": criterion,
@@ -427,7 +614,27 @@ def main():
         elif data_type == "Animal Requirements":
             st.dataframe(animal_data, use_container_width=True)
         else:
-            view_data = survival_results.drop(columns=['criteria_details'])
+            # Filters select pair rows through the name index instead of scanning the results
+            col1, col2 = st.columns(2)
+            with col1:
+                filter_animals = st.multiselect("Filter animals", options=sorted(animal_index))
+            with col2:
+                filter_locations = st.multiselect("Filter locations", options=sorted(location_index))
+            
+            if not (filter_animals or filter_locations):
+                view_data = build_survival_view(dataset_key, threshold, scored_results)
+            else:
+                n_animals, n_locations = criteria_masks.shape
+                animal_positions = (np.concatenate([animal_index[name] for name in filter_animals])
+                                    if filter_animals else np.arange(n_animals))
+                location_positions = (np.concatenate([location_index[name] for name in filter_locations])
+                                      if filter_locations else np.arange(n_locations))
+                pair_positions = (animal_positions[:, None] * n_locations + location_positions).ravel()
+                pair_rows = build_pair_rows(dataset_key, scored_results)
+                # Only the selected rows get a can_survive label
+                view_data = apply_threshold(scored_results.iloc[np.sort(pair_rows[pair_positions])], threshold,
+                                            keep_mask=False)
+            
             st.dataframe(view_data, use_container_width=True)
     
     with tab4:
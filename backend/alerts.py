@@ -0,0 +1,412 @@
+import argparse
+import queue
+import smtplib
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+class SMTPTransport:
+    """
+    One SMTP connection kept open across messages.
+
+    The connection (and its STARTTLS and login) is opened on the first
+    message and reused until the server drops it or a send fails.
+    """
+
+    # Errors that a retry cannot fix
+    PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPAuthenticationError)
+
+    def __init__(self, host, port=587, username=None, password=None, use_tls=True, from_addr=None, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.from_addr = from_addr or username
+        self.timeout = timeout
+        self.connection = None
+
+    def connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                connection.starttls()
+            # Local test servers usually accept mail without a login
+            if self.username:
+                connection.login(self.username, self.password)
+        except Exception:
+            # Do not leak the socket when the handshake fails, every retry would open another
+            connection.close()
+            raise
+        return connection
+
+    def send(self, to_email, subject, message):
+        msg = MIMEMultipart()
+        msg["From"] = self.from_addr
+        msg["To"] = to_email
+        msg["Subject"] = subject
+        msg.attach(MIMEText(message, "plain"))
+
+        if self.connection is None:
+            self.connection = self.connect()
+        try:
+            self.connection.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Servers close idle connections, reconnect once before giving up
+            self.connection = None
+            self.connection = self.connect()
+            self.connection.send_message(msg)
+
+    def is_permanent(self, error):
+        return isinstance(error, self.PERMANENT_ERRORS)
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.connection = None
+
+class TwilioTransport:
+    """A Twilio client, and so its HTTP session, kept open across messages."""
+
+    def __init__(self, account_sid, auth_token, from_number):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.client = None
+
+    def send(self, to_phone, message):
+        if self.client is None:
+            from twilio.rest import Client
+            self.client = Client(self.account_sid, self.auth_token)
+        self.client.messages.create(
+            body=message,
+            from_=self.from_number,
+            to=to_phone
+        )
+
+    def is_permanent(self, error):
+        # Bad numbers and credentials come back as 4xx, rate limiting (429) is worth retrying
+        status = getattr(error, "status", None)
+        return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+    def close(self):
+        self.client = None
+
+class AlertDispatcher:
+    """
+    Send alerts from a pool of background workers.
+
+    send_email and send_sms only queue the alert, so callers never wait on
+    the mail server or Twilio. Every worker builds its own transports from
+    the factories and keeps them open, so connections are reused but never
+    shared between threads. A failed send is retried after an exponential
+    backoff (backoff, 2 * backoff, ... capped at max_backoff) until
+    max_retries retries have failed or the error is permanent.
+    """
+
+    def __init__(self, transports, workers=2, max_retries=3, backoff=1.0, max_backoff=60.0, max_queued=10000):
+        """
+        Parameters:
+        transports (dict): Alert kind ("email", "sms") -> zero-argument transport factory
+        workers (int): Number of worker threads
+        max_retries (int): Retries after the first failed attempt
+        backoff (float): Seconds before the first retry
+        max_backoff (float): Longest wait between retries
+        max_queued (int): Alerts queued before new ones are dropped
+        """
+        self.transports = transports
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.queue = queue.Queue(max_queued)
+        self.stopped = False
+        # Alerts queued, being sent or waiting for a retry
+        self.pending = 0
+        self.idle = threading.Condition()
+
+        self.threads = [
+            threading.Thread(target=self._work, name=f"alert-worker-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, kind, *args):
+        """
+        Queue an alert for the transport of the given kind.
+
+        Returns:
+        bool: False when the queue is full or the dispatcher is stopped and the alert was dropped
+        """
+        if kind not in self.transports:
+            raise KeyError(f"No transport for {kind} alerts")
+        if self.stopped:
+            return False
+        with self.idle:
+            self.pending += 1
+        try:
+            self.queue.put_nowait((kind, args, 0))
+        except queue.Full:
+            self._done()
+            print(f"Alert queue full, dropping {kind} alert")
+            return False
+        return True
+
+    def send_email(self, to_email, subject, message):
+        return self.submit("email", to_email, subject, message)
+
+    def send_sms(self, to_phone, message):
+        return self.submit("sms", to_phone, message)
+
+    def _work(self):
+        transports = {}
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            kind, args, attempt = job
+            try:
+                if kind not in transports:
+                    transports[kind] = self.transports[kind]()
+                transports[kind].send(*args)
+            except Exception as e:
+                self._failed(transports.get(kind), job, e)
+            else:
+                self._done()
+
+        for transport in transports.values():
+            transport.close()
+
+    def _failed(self, transport, job, error):
+        kind, args, attempt = job
+        permanent = transport is not None and transport.is_permanent(error)
+        if transport is not None and not permanent:
+            # Start the retry from a fresh connection
+            transport.close()
+        if permanent or attempt >= self.max_retries or self.stopped:
+            print(f"Failed to send {kind} alert after {attempt + 1} attempts: {str(error)}")
+            self._done()
+            return
+
+        # Wait on a timer so the worker can carry on with other alerts meanwhile
+        delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+        timer = threading.Timer(delay, self._retry, args=((kind, args, attempt + 1),))
+        timer.daemon = True
+        timer.start()
+
+    def _retry(self, job):
+        if self.stopped:
+            print(f"Dropping {job[0]} alert retry, dispatcher stopped")
+            self._done()
+            return
+        self.queue.put(job)
+
+    def _done(self):
+        with self.idle:
+            self.pending -= 1
+            if self.pending == 0:
+                self.idle.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued alert has been sent or given up on.
+
+        Returns:
+        bool: False if the timeout expired first
+        """
+        with self.idle:
+            return self.idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def stop(self, timeout=5):
+        """Let the workers finish the queued alerts, then close their connections."""
+        if self.stopped:
+            return
+        self.stopped = True
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+
+def _start_thread(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+# A change of an alert, status is "opened" or "resolved", changes counts the
+# state changes within one digest window this event stands for
+AlertEvent = namedtuple("AlertEvent", ["parameter", "status", "message", "timestamp", "changes"])
+
+class AlertManager:
+    """
+    Open, resolve and coalesce alerts per scope (a location or an emergency) and parameter.
+
+    An alert opens when a reading leaves its threshold range and stays open,
+    without further notifications, until a reading is back inside the range
+    by the hysteresis band, so a value hovering at a threshold does not
+    flap. Openings and resolutions are collected into digests: the first
+    change after a quiet period is sent right away, later ones at most once
+    per window. Within a window only the first and the latest change of an
+    alert are kept.
+
+    Digests are sent from a background task started with start_task, which
+    sleeps between digests with sleep. Pass the server's own primitives
+    (e.g. socketio.start_background_task and socketio.sleep) when notify
+    emits socket events, so they run in a task the server supports.
+    """
+
+    def __init__(self, notify, thresholds=None, units=None, hysteresis=0.05, window=60.0, start_task=None,
+                 sleep=time.sleep):
+        """
+        Parameters:
+        notify (callable): Called from the digest task with a digest, scope -> list of AlertEvent
+        thresholds (dict): Parameter -> {'min': ..., 'max': ...}
+        units (dict): Parameter -> unit appended to values in messages
+        hysteresis (float): Fraction of the range width a value must be back inside to resolve its alert
+        window (float): Seconds between digests
+        start_task (callable): start_task(target) runs target in the background, None for a daemon thread
+        sleep (callable): Sleep function matching start_task
+        """
+        self.notify = notify
+        self.thresholds = thresholds or {}
+        self.units = units or {}
+        self.hysteresis = hysteresis
+        self.window = window
+        # (scope, parameter) -> failing readings since the alert opened
+        self.open = {}
+        # scope -> parameter -> first and latest change not yet sent
+        self.pending = {}
+        self.start_task = start_task or _start_thread
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        # Whether the digest task is running
+        self.sending = False
+
+    def observe(self, scope, readings):
+        """
+        Update the alerts of a scope from one reading.
+
+        Parameters:
+        scope: Location or emergency the reading belongs to
+        readings (dict): Parameter -> value, parameters without thresholds and non-numeric values are ignored
+
+        Returns:
+        list: Messages for the parameters out of range in this reading
+        """
+        alerts = []
+        for parameter, value in readings.items():
+            limits = self.thresholds.get(parameter)
+            if limits is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            unit = self.units.get(parameter, "")
+            band = self.hysteresis * (limits['max'] - limits['min'])
+            if value < limits['min'] or value > limits['max']:
+                message = f"{parameter.capitalize()} out of range: {value}{unit}"
+                alerts.append(message)
+                self.update(scope, parameter, True, message)
+            elif limits['min'] + band <= value <= limits['max'] - band:
+                self.update(scope, parameter, False, f"{parameter.capitalize()} back in range: {value}{unit}")
+        return alerts
+
+    def update(self, scope, parameter, failing, message):
+        """
+        Record whether a condition of a scope currently fails.
+
+        Only opening and resolving an alert produce an event, repeated
+        failures of an open alert are just counted.
+
+        Parameters:
+        scope: Location or emergency the condition belongs to
+        parameter (str): Name of the condition
+        failing (bool): Whether the condition fails now
+        message (str): Description of the current state, used in the event
+        """
+        key = (scope, parameter)
+        with self.lock:
+            if failing and key in self.open:
+                self.open[key] += 1
+                return
+            if failing:
+                self.open[key] = 1
+                status = "opened"
+            elif self.open.pop(key, None) is not None:
+                status = "resolved"
+            else:
+                return
+
+            events = self.pending.setdefault(scope, {}).setdefault(parameter, [])
+            event = AlertEvent(parameter, status, message, datetime.utcnow(), 1)
+            if len(events) < 2:
+                events.append(event)
+            else:
+                events[1] = event._replace(changes=events[1].changes + 1)
+            if not self.sending:
+                # Nothing sent within the last window, send right away
+                self.sending = True
+                self.start_task(self._send_digests)
+
+    def is_open(self, scope, parameter):
+        with self.lock:
+            return (scope, parameter) in self.open
+
+    def _send_digests(self):
+        while True:
+            digest = self.flush()
+            with self.lock:
+                if not (digest or self.pending):
+                    self.sending = False
+                    return
+            # Hold later events back for a window
+            self.sleep(self.window)
+
+    def flush(self):
+        """
+        Send the pending events now.
+
+        Returns:
+        dict: The digest that was sent, empty if there was nothing to send
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        digest = {
+            scope: [event for events in parameters.values() for event in events]
+            for scope, parameters in pending.items()
+        }
+        if digest:
+            try:
+                self.notify(digest)
+            except Exception as e:
+                print(f"Failed to send alert digest: {str(e)}")
+        return digest
+
+    def close(self):
+        """Send whatever is pending now, the digest task exits once it finds nothing to send."""
+        self.flush()
+
+if __name__ == "__main__":
+    # Try the dispatcher against a local fake SMTP server, e.g.
+    # python -m aiosmtpd -n -l localhost:1025
+    parser = argparse.ArgumentParser(description="Send test email alerts through the dispatch queue")
+    parser.add_argument("--to", default="alerts@localhost")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--tls", action="store_true", help="Run STARTTLS before sending")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    dispatcher = AlertDispatcher(
+        {"email": lambda: SMTPTransport(args.host, args.port, use_tls=args.tls, from_addr="sanrakshika@localhost")},
+        workers=args.workers
+    )
+    start = time.perf_counter()
+    for i in range(args.count):
+        dispatcher.send_email(args.to, f"Test alert {i + 1}", f"Test alert {i + 1} of {args.count}")
+    queued = time.perf_counter() - start
+    dispatcher.flush()
+    dispatcher.stop()
+    print(f"Queued {args.count} alerts in {queued * 1000:.1f} ms, sent in {time.perf_counter() - start:.2f} s")
@@ -2,19 +2,22 @@ from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 from flask_pymongo import PyMongo
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
+import json
+import base64
+import atexit
 # from dotenv import load_dotenv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from twilio.rest import Client
 import jwt
 from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
 import firebase_admin
 from firebase_admin import credentials, auth
 from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from alerts import AlertDispatcher, AlertManager, SMTPTransport, TwilioTransport
+from cache import TTLCache
 
 # Load environment variables
 load_dotenv()
@@ -30,7 +33,8 @@ CORS(app, resources={
     r"/api/*": {
         "origins": ["http://localhost:5173", "http://localhost:3000", "https://your-production-domain.com"],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Next-Cursor"]
     }
 })
 
@@ -41,6 +45,17 @@ app.config["MONGO_URI"] = os.getenv("MONGODB_URI", "mongodb://localhost:27017/sa
 mongo = PyMongo(app)
 db = mongo.db
 
+def ensure_indexes():
+    # Newest-first reads, with or without a location filter, walk an index instead of sorting in memory.
+    # _id breaks ties between readings stored with the same timestamp, e.g. by one bulk request.
+    try:
+        db.cryo_data.create_index([('location', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)])
+        db.cryo_data.create_index([('timestamp', DESCENDING), ('_id', DESCENDING)])
+    except Exception as e:
+        print(f"Failed to create indexes: {str(e)}")
+
+ensure_indexes()
+
 # JWT configuration
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")
 JWT_ALGORITHM = "HS256"
@@ -51,12 +66,32 @@ SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USERNAME = os.getenv("SMTP_USERNAME")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USERNAME)
+# Set to "false" for a local test server without TLS
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() != "false"
 
 # Twilio configuration
 TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+# Alert dispatch configuration
+ALERT_WORKERS = int(os.getenv("ALERT_WORKERS", "2"))
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "3"))
+ALERT_RETRY_BACKOFF = float(os.getenv("ALERT_RETRY_BACKOFF", "1"))
+
+# Emails and SMS are sent by background workers over connections they keep open
+alert_dispatcher = AlertDispatcher(
+    {
+        "email": lambda: SMTPTransport(SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD,
+                                       use_tls=SMTP_USE_TLS, from_addr=SMTP_FROM),
+        "sms": lambda: TwilioTransport(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER)
+    },
+    workers=ALERT_WORKERS,
+    max_retries=ALERT_MAX_RETRIES,
+    backoff=ALERT_RETRY_BACKOFF
+)
+atexit.register(alert_dispatcher.stop)
 
 # Alert thresholds
 ALERT_THRESHOLDS = {
@@ -65,6 +100,40 @@ ALERT_THRESHOLDS = {
     'humidity': {'min': 0, 'max': 5},  # %
 }
 
+# Most readings accepted by one bulk ingestion request
+MAX_BULK_READINGS = int(os.getenv("MAX_BULK_READINGS", "10000"))
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Page size of /api/cryo-data reads
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# Emergency monitoring thresholds
+MONITORING_THRESHOLDS = {
+    'temperature': {'min': -196, 'max': -150},  # °C
+    'pressure': {'min': 1, 'max': 2},  # bar
+}
+MONITORING_UNITS = {'temperature': '°C', 'pressure': ' bar'}
+
+# Alert suppression configuration
+ALERT_HYSTERESIS = float(os.getenv("ALERT_HYSTERESIS", "0.05"))  # fraction of each threshold range
+ALERT_COALESCE_SECONDS = float(os.getenv("ALERT_COALESCE_SECONDS", "60"))
+
+# Auth cache configuration
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))  # seconds, tokens never outlive their exp claim
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # seconds
+
+# Verified Firebase tokens -> decoded claims
+token_cache = TTLCache(max_entries=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+# Firebase uid -> user document
+user_cache = TTLCache(max_entries=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def invalidate_user(firebase_uid):
+    # Call whenever a user document changes, so token_required reloads it
+    user_cache.invalidate(firebase_uid)
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -74,52 +143,69 @@ def token_required(f):
         if not token:
             return jsonify({"message": "Token is missing"}), 401
         try:
-            # Verify Firebase token
-            decoded_token = auth.verify_id_token(token)
-            current_user = db.users.find_one({"firebase_uid": decoded_token['uid']})
-            if not current_user:
-                return jsonify({"message": "User not found"}), 401
+            decoded_token = token_cache.get(token)
+            if decoded_token is None:
+                # Verify Firebase token
+                decoded_token = auth.verify_id_token(token)
+                token_cache.set(token, decoded_token, expires_at=decoded_token.get('exp'))
+            current_user = user_cache.get(decoded_token['uid'])
+            if current_user is None:
+                current_user = db.users.find_one({"firebase_uid": decoded_token['uid']})
+                if not current_user:
+                    return jsonify({"message": "User not found"}), 401
+                user_cache.set(decoded_token['uid'], current_user)
         except Exception as e:
             return jsonify({"message": "Invalid token"}), 401
-        return f(current_user, *args, **kwargs)
+        # Routes modify the user they get, so hand them a copy of the cached document
+        return f(dict(current_user), *args, **kwargs)
     return decorated
 
 def send_email_alert(to_email, subject, message):
-    try:
-        msg = MIMEMultipart()
-        msg["From"] = SMTP_USERNAME
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(message, "plain"))
-
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-    except Exception as e:
-        print(f"Failed to send email: {str(e)}")
+    # Only queues the email, the request does not wait for the mail server
+    alert_dispatcher.send_email(to_email, subject, message)
 
 def send_sms_alert(to_phone, message):
-    try:
-        twilio_client.messages.create(
-            body=message,
-            from_=TWILIO_PHONE_NUMBER,
-            to=to_phone
+    # Only queues the SMS, the request does not wait for Twilio
+    alert_dispatcher.send_sms(to_phone, message)
+
+def format_digest(scope_label, digest):
+    lines = []
+    for scope, events in digest.items():
+        lines.append(scope_label(scope))
+        lines.extend(
+            f"  [{event.status}] {event.message}" + (f" ({event.changes} changes)" if event.changes > 1 else "")
+            for event in events
         )
-    except Exception as e:
-        print(f"Failed to send SMS: {str(e)}")
+    return "\n".join(lines)
 
-def check_alerts(data):
-    alerts = []
-    
-    for parameter, value in data.items():
-        if parameter in ALERT_THRESHOLDS:
-            thresholds = ALERT_THRESHOLDS[parameter]
-            if value < thresholds['min'] or value > thresholds['max']:
-                alerts.append(f"{parameter.capitalize()} out of range: {value}")
-    
-    return alerts
+def send_cryo_digest(digest):
+    # One email and SMS for every location whose alerts opened or resolved during the window
+    locations = list(digest)
+    subject = f"Cryo Alert - {locations[0]}" if len(locations) == 1 else f"Cryo Alert - {len(locations)} locations"
+    alert_message = format_digest(lambda location: f"Alert for {location}:", digest)
+
+    send_email_alert(os.getenv('ALERT_EMAIL'), subject, alert_message)
+    send_sms_alert(os.getenv('ALERT_PHONE'), alert_message)
+
+    for location, events in digest.items():
+        socketio.emit('new_alert', {
+            'location': location,
+            'alerts': [event.message for event in events if event.status == 'opened'],
+            'resolved': [event.message for event in events if event.status == 'resolved'],
+            'timestamp': events[-1].timestamp.isoformat()
+        })
+
+# Opens one alert per location and parameter and coalesces the notifications
+cryo_alerts = AlertManager(
+    send_cryo_digest,
+    thresholds=ALERT_THRESHOLDS,
+    hysteresis=ALERT_HYSTERESIS,
+    window=ALERT_COALESCE_SECONDS,
+    # Digests emit socket events, so they run as SocketIO background tasks
+    start_task=socketio.start_background_task,
+    sleep=socketio.sleep
+)
+atexit.register(cryo_alerts.close)
 
 @app.route('/')
 def index():
@@ -154,6 +240,7 @@ def register():
         }
 
         db.users.insert_one(user)
+        invalidate_user(firebase_uid)
         user['_id'] = str(user['_id'])
         del user['password']
 
@@ -198,19 +285,86 @@ def get_current_user(current_user):
         del current_user['password']
     return jsonify(current_user)
 
+def parse_timestamp(value):
+    # ISO 8601 time of a reading, stored as naive UTC like datetime.utcnow()
+    if not isinstance(value, str):
+        raise ValueError('timestamp must be an ISO 8601 string')
+    timestamp = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def encode_cursor(item):
+    # Opaque token for the position after item in (timestamp, _id) descending order
+    position = json.dumps([item['timestamp'].isoformat(), str(item['_id'])])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor):
+    timestamp, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(timestamp), ObjectId(object_id)
+
 # Protected Routes
 @app.route('/api/cryo-data', methods=['GET'])
 @token_required
 def get_cryo_data(current_user):
+    # Readings newest first. Optional query parameters: location, since and until (ISO
+    # timestamps, until exclusive), fields (comma separated, _id and timestamp always
+    # included), limit and cursor. X-Next-Cursor holds the cursor of the next page, if any.
     location = request.args.get('location')
-    query = {'location': location} if location else {}
-    
+    conditions = [{'location': location}] if location else []
+
     try:
-        data = list(db.cryo_data.find(query).sort('timestamp', -1).limit(100))
+        since = request.args.get('since')
+        if since:
+            conditions.append({'timestamp': {'$gte': parse_timestamp(since)}})
+        until = request.args.get('until')
+        if until:
+            conditions.append({'timestamp': {'$lt': parse_timestamp(until)}})
+        limit = min(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            timestamp, object_id = decode_cursor(cursor)
+        except Exception:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        # Keyset pagination: continue right after the last reading of the previous page
+        conditions.append({'$or': [
+            {'timestamp': {'$lt': timestamp}},
+            {'timestamp': timestamp, '_id': {'$lt': object_id}}
+        ]})
+
+    fields = request.args.get('fields')
+    projection = None
+    if fields:
+        projection = {field.strip(): 1 for field in fields.split(',') if field.strip()}
+        projection['timestamp'] = 1
+
+    query = {'$and': conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+
+    try:
+        # One reading past the page tells whether there is a next page
+        data = list(
+            db.cryo_data.find(query, projection)
+            .sort([('timestamp', DESCENDING), ('_id', DESCENDING)])
+            .limit(limit + 1)
+        )
+        next_cursor = encode_cursor(data[limit - 1]) if len(data) > limit else None
+        data = data[:limit]
         for item in data:
             item['_id'] = str(item['_id'])
             item['timestamp'] = item['timestamp'].isoformat()
-        return jsonify(data)
+            if 'user_id' in item:
+                item['user_id'] = str(item['user_id'])
+
+        response = jsonify(data)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -218,32 +372,17 @@ def get_cryo_data(current_user):
 @token_required
 def add_cryo_data(current_user):
     data = request.json
+    if not isinstance(data, dict) or not isinstance(data.get('location'), str) or not data['location']:
+        return jsonify({'message': 'location is required'}), 400
     data['timestamp'] = datetime.utcnow()
     data['user_id'] = current_user['_id']
     
     try:
-        alerts = check_alerts(data)
-        if alerts:
-            alert_message = f"Alert for {data['location']}: {'; '.join(alerts)}"
-            
-            send_email_alert(
-                os.getenv('ALERT_EMAIL'),
-                f"Cryo Alert - {data['location']}",
-                alert_message
-            )
-            
-            send_sms_alert(
-                os.getenv('ALERT_PHONE'),
-                alert_message
-            )
-            
-            socketio.emit('new_alert', {
-                'location': data['location'],
-                'alerts': alerts,
-                'timestamp': data['timestamp'].isoformat()
-            })
-        
         result = db.cryo_data.insert_one(data)
+
+        # Only stored readings reach the alert manager, notifications go out when an alert opens or resolves
+        cryo_alerts.observe(data['location'], data)
+
         data['_id'] = str(result.inserted_id)
         data['timestamp'] = data['timestamp'].isoformat()
         
@@ -251,6 +390,105 @@ def add_cryo_data(current_user):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def parse_bulk_readings():
+    # NDJSON is read line by line from the request stream, anything else must be one JSON array
+    if request.mimetype in NDJSON_MIMETYPES:
+        readings, errors = [], {}
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            if len(readings) == MAX_BULK_READINGS:
+                # One reading over the limit is enough to reject the request
+                readings.append(None)
+                break
+            try:
+                readings.append(json.loads(line))
+            except ValueError as e:
+                errors[len(readings)] = f"Invalid JSON: {str(e)}"
+                readings.append(None)
+        return readings, errors
+
+    readings = request.get_json(silent=True)
+    if not isinstance(readings, list):
+        raise ValueError('Expected a JSON array or NDJSON stream of readings')
+    return readings, {}
+
+def validate_reading(reading):
+    if not isinstance(reading, dict):
+        return 'Reading must be a JSON object'
+    if not isinstance(reading.get('location'), str) or not reading['location']:
+        return 'location is required'
+    for parameter in ALERT_THRESHOLDS:
+        value = reading.get(parameter)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return f'{parameter} must be a number'
+    if reading.get('timestamp') is not None:
+        try:
+            parse_timestamp(reading['timestamp'])
+        except ValueError:
+            return 'timestamp must be an ISO 8601 time'
+    return None
+
+@app.route('/api/cryo-data/bulk', methods=['POST'])
+@token_required
+def add_cryo_data_bulk(current_user):
+    try:
+        readings, errors = parse_bulk_readings()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if not readings:
+        return jsonify({'message': 'No readings'}), 400
+    if len(readings) > MAX_BULK_READINGS:
+        return jsonify({'message': f'At most {MAX_BULK_READINGS} readings per request'}), 413
+
+    received_at = datetime.utcnow()
+    results = [None] * len(readings)
+    documents, positions = [], []
+
+    try:
+        for i, reading in enumerate(readings):
+            error = errors.get(i) or validate_reading(reading)
+            if error:
+                results[i] = {'index': i, 'status': 'invalid', 'error': error}
+                continue
+            # Gateways send the time each reading was taken, server time is only the fallback
+            timestamp = reading.get('timestamp')
+            reading['timestamp'] = parse_timestamp(timestamp) if timestamp is not None else received_at
+            reading['user_id'] = current_user['_id']
+            documents.append(reading)
+            positions.append(i)
+
+        # Unordered, so one failed document does not stop the rest
+        write_errors = {}
+        if documents:
+            try:
+                db.cryo_data.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                write_errors = {error['index']: error['errmsg'] for error in e.details.get('writeErrors', [])}
+
+        stored = []
+        for n, (i, document) in enumerate(zip(positions, documents)):
+            if n in write_errors:
+                results[i] = {'index': i, 'status': 'error', 'error': write_errors[n]}
+            else:
+                results[i] = {'index': i, 'status': 'created', '_id': str(document['_id'])}
+                stored.append(document)
+
+        # Check alerts for the stored readings only, in the order they were taken; the alert
+        # manager coalesces the notifications of the whole batch
+        for document in sorted(stored, key=lambda document: document['timestamp']):
+            cryo_alerts.observe(document['location'], document)
+
+        inserted = len(documents) - len(write_errors)
+        return jsonify({
+            'inserted': inserted,
+            'failed': len(readings) - inserted,
+            'results': results
+        }), 201 if inserted == len(readings) else 207
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/locations', methods=['GET'])
 @token_required
 def get_locations(current_user):
@@ -349,9 +587,7 @@ def update_monitoring_status(current_user, emergency_id):
         )
 
         # Check for any alerts
-        alerts = check_monitoring_alerts(monitoring_data)
-        if alerts:
-            send_monitoring_alerts(emergency_id, alerts)
+        check_monitoring_alerts(emergency_id, monitoring_data)
 
         return jsonify({'message': 'Monitoring data updated successfully'})
 
@@ -413,45 +649,56 @@ def send_emergency_alerts(emergency_data, cryo_analysis, delivery_plan):
         'delivery_plan': delivery_plan
     })
 
-def check_monitoring_alerts(monitoring_data):
-    alerts = []
-    
-    if monitoring_data['temperature'] < -196 or monitoring_data['temperature'] > -150:
-        alerts.append(f"Temperature out of range: {monitoring_data['temperature']}°C")
-    
-    if monitoring_data['pressure'] < 1 or monitoring_data['pressure'] > 2:
-        alerts.append(f"Pressure out of range: {monitoring_data['pressure']} bar")
-    
-    if monitoring_data['stability'] != 'Excellent':
-        alerts.append(f"Stability issue: {monitoring_data['stability']}")
-    
-    return alerts
-
-def send_monitoring_alerts(emergency_id, alerts):
-    emergency = db.emergencies.find_one({'_id': ObjectId(emergency_id)})
-    if not emergency:
+def check_monitoring_alerts(emergency_id, monitoring_data):
+    # Notifications go out from the alert manager when an alert opens or resolves
+    monitoring_alerts.observe(emergency_id, monitoring_data)
+
+    stability = monitoring_data['stability']
+    if stability != 'Excellent':
+        monitoring_alerts.update(emergency_id, 'stability', True, f"Stability issue: {stability}")
+    else:
+        monitoring_alerts.update(emergency_id, 'stability', False, f"Stability back to {stability}")
+
+def send_monitoring_digest(digest):
+    # A single lookup for every emergency in the digest
+    emergencies = {
+        str(emergency['_id']): emergency
+        for emergency in db.emergencies.find({'_id': {'$in': [ObjectId(emergency_id) for emergency_id in digest]}})
+    }
+    digest = {emergency_id: events for emergency_id, events in digest.items() if emergency_id in emergencies}
+    if not digest:
         return
 
-    alert_message = f"""
-    Monitoring Alert for Emergency {emergency_id}
-    Species: {emergency['species']}
-    Location: {emergency['location']['address']}
-    
-    Alerts:
-    {chr(10).join(alerts)}
-    """
-
-    send_email_alert(
-        os.getenv('ALERT_EMAIL'),
-        f"Monitoring Alert - Emergency {emergency_id}",
-        alert_message
-    )
+    def scope_label(emergency_id):
+        emergency = emergencies[emergency_id]
+        return (f"Monitoring Alert for Emergency {emergency_id}\n"
+                f"Species: {emergency['species']}\n"
+                f"Location: {emergency['location']['address']}\n"
+                f"Alerts:")
+
+    subject = (f"Monitoring Alert - Emergency {next(iter(digest))}" if len(digest) == 1
+               else f"Monitoring Alert - {len(digest)} emergencies")
+    send_email_alert(os.getenv('ALERT_EMAIL'), subject, format_digest(scope_label, digest))
+
+    for emergency_id, events in digest.items():
+        socketio.emit('monitoring_alert', {
+            'emergency_id': emergency_id,
+            'alerts': [event.message for event in events if event.status == 'opened'],
+            'resolved': [event.message for event in events if event.status == 'resolved'],
+            'timestamp': events[-1].timestamp.isoformat()
+        })
 
-    socketio.emit('monitoring_alert', {
-        'emergency_id': emergency_id,
-        'alerts': alerts,
-        'timestamp': datetime.utcnow().isoformat()
-    })
+# Opens one alert per emergency and parameter and coalesces the notifications
+monitoring_alerts = AlertManager(
+    send_monitoring_digest,
+    thresholds=MONITORING_THRESHOLDS,
+    units=MONITORING_UNITS,
+    hysteresis=ALERT_HYSTERESIS,
+    window=ALERT_COALESCE_SECONDS,
+    start_task=socketio.start_background_task,
+    sleep=socketio.sleep
+)
+atexit.register(monitoring_alerts.close)
 
 # WebSocket events
 @socketio.on('connect')
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    A bounded, thread-safe mapping whose entries expire.
+
+    Entries live for at most ttl seconds, or until their own expiry time
+    if that comes first. Once max_entries is reached the least recently
+    used entry is evicted.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300, clock=time.time):
+        """
+        Parameters:
+        max_entries (int): Most entries kept
+        ttl (float): Seconds an entry is kept at most
+        clock (callable): Current time in seconds since the epoch
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (value, expiry time), least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= self.clock():
+                del self.entries[key]
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        """
+        Store a value.
+
+        Parameters:
+        key: Cache key
+        value: Value to store
+        expires_at (float): Time the value stops being valid, e.g. a token's exp claim
+        """
+        deadline = self.clock() + self.ttl
+        if expires_at is not None:
+            deadline = min(deadline, expires_at)
+        with self.lock:
+            self.entries[key] = (value, deadline)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,115 @@
+import smtplib
+import threading
+import unittest
+from unittest import mock
+
+from alerts import AlertDispatcher, SMTPTransport
+
+class FakeSMTP:
+    """
+    Stand-in for smtplib.SMTP that records what it is asked to do.
+
+    failures is a list of errors raised by the next send_message calls,
+    login_error is raised by every login.
+    """
+
+    instances = []
+    sent = []
+    failures = []
+    login_error = None
+    lock = threading.Lock()
+
+    def __init__(self, host, port, timeout=None):
+        self.host = host
+        self.port = port
+        self.calls = []
+        with self.lock:
+            self.instances.append(self)
+
+    def starttls(self):
+        self.calls.append("starttls")
+
+    def login(self, username, password):
+        self.calls.append("login")
+        if self.login_error is not None:
+            raise self.login_error
+
+    def send_message(self, msg):
+        with self.lock:
+            if self.failures:
+                raise self.failures.pop(0)
+            self.sent.append(msg)
+
+    def quit(self):
+        self.calls.append("quit")
+
+    def close(self):
+        self.calls.append("close")
+
+class DispatcherTest(unittest.TestCase):
+    def setUp(self):
+        FakeSMTP.instances = []
+        FakeSMTP.sent = []
+        FakeSMTP.failures = []
+        FakeSMTP.login_error = None
+        patcher = mock.patch("alerts.smtplib.SMTP", FakeSMTP)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def dispatcher(self, **kwargs):
+        factory = lambda: SMTPTransport("localhost", 1025, username="user", password="secret", from_addr="alerts@example.com")
+        dispatcher = AlertDispatcher({"email": factory}, workers=1, backoff=0.01, **kwargs)
+        self.addCleanup(dispatcher.stop)
+        return dispatcher
+
+    def test_delivers_over_one_connection(self):
+        dispatcher = self.dispatcher()
+        self.assertTrue(dispatcher.send_email("a@example.com", "First", "Hello"))
+        self.assertTrue(dispatcher.send_email("b@example.com", "Second", "Hello again"))
+        self.assertTrue(dispatcher.flush(timeout=5))
+        dispatcher.stop()
+
+        self.assertEqual([msg["To"] for msg in FakeSMTP.sent], ["a@example.com", "b@example.com"])
+        self.assertEqual(FakeSMTP.sent[0]["From"], "alerts@example.com")
+        self.assertEqual(len(FakeSMTP.instances), 1)
+        self.assertEqual(FakeSMTP.instances[0].calls, ["starttls", "login", "quit"])
+
+    def test_retries_transient_errors(self):
+        FakeSMTP.failures = [smtplib.SMTPDataError(451, b"Try again later")] * 2
+        dispatcher = self.dispatcher(max_retries=3)
+        dispatcher.send_email("a@example.com", "Alert", "Hello")
+        self.assertTrue(dispatcher.flush(timeout=5))
+
+        self.assertEqual(len(FakeSMTP.sent), 1)
+        # Every retry starts from a fresh connection
+        self.assertEqual(len(FakeSMTP.instances), 3)
+
+    def test_gives_up_after_max_retries(self):
+        FakeSMTP.failures = [smtplib.SMTPDataError(451, b"Try again later")] * 5
+        dispatcher = self.dispatcher(max_retries=2)
+        dispatcher.send_email("a@example.com", "Alert", "Hello")
+        self.assertTrue(dispatcher.flush(timeout=5))
+
+        self.assertEqual(FakeSMTP.sent, [])
+        self.assertEqual(len(FakeSMTP.failures), 2)
+
+    def test_permanent_errors_are_not_retried(self):
+        FakeSMTP.failures = [smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user")})]
+        dispatcher = self.dispatcher(max_retries=3)
+        dispatcher.send_email("a@example.com", "Alert", "Hello")
+        self.assertTrue(dispatcher.flush(timeout=5))
+
+        self.assertEqual(FakeSMTP.sent, [])
+        self.assertEqual(len(FakeSMTP.instances), 1)
+
+    def test_failed_login_closes_the_connection(self):
+        FakeSMTP.login_error = smtplib.SMTPAuthenticationError(535, b"Bad credentials")
+        dispatcher = self.dispatcher(max_retries=3)
+        dispatcher.send_email("a@example.com", "Alert", "Hello")
+        self.assertTrue(dispatcher.flush(timeout=5))
+
+        self.assertEqual(len(FakeSMTP.instances), 1)
+        self.assertEqual(FakeSMTP.instances[0].calls, ["starttls", "login", "close"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import pandas as pd
+import numpy as np
+
+import algorithm
+from synthetic import generate_animals, generate_locations
+
+# Dataset scales as (animals, locations)
+PRESETS = {
+    "small": [(100, 1_000), (100, 10_000), (1_000, 10_000)],
+    "medium": [(100, 100_000), (1_000, 100_000), (10_000, 10_000)],
+    "full": [(10, 1_000_000), (100, 1_000_000), (1_000, 1_000_000), (10_000, 1_000_000)]
+}
+
+# Above this many pairs the full-frame benchmarks are skipped, and recorded as skipped in the report
+MAX_FULL_PAIRS = 10_000_000
+
+def measure(func, repeat=1, trace_memory=True):
+    """
+    Return the best wall time of repeat runs of func and its peak traced memory.
+
+    Timing runs are made without tracemalloc, which slows down allocation-heavy
+    code; the peak memory comes from one extra traced run.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return min(timings), peak
+
+def consume(chunks):
+    """Exhaust a chunk iterator without keeping the chunks."""
+    for _ in chunks:
+        pass
+
+def load_app_variant():
+    """Import app.calculate_survival_match, or None when streamlit is not installed."""
+    try:
+        import app
+    except ImportError:
+        return None
+    return app.calculate_survival_match
+
+def benchmark_cases(land_data, animal_data, app_variant, max_full_pairs=MAX_FULL_PAIRS):
+    """
+    Benchmarks to run for one dataset scale.
+
+    The full-frame benchmarks hold every animal-location pair in memory, so
+    above max_full_pairs they map to None and are reported as skipped.
+    """
+    cases = {
+        "iter_survival_match": lambda: consume(algorithm.iter_survival_match(land_data, animal_data)),
+        "top_locations_per_animal": lambda: algorithm.top_locations_per_animal(land_data, animal_data, k=5)
+    }
+    full_frame = len(land_data) * len(animal_data) <= max_full_pairs
+    cases["calculate_survival_match"] = (
+        (lambda: algorithm.calculate_survival_match(land_data, animal_data)) if full_frame else None)
+    if app_variant is not None:
+        cases["app.calculate_survival_match"] = (lambda: app_variant(land_data, animal_data)) if full_frame else None
+    return cases
+
+def run(scales, repeat=1, trace_memory=True, max_full_pairs=MAX_FULL_PAIRS):
+    """
+    Benchmark every scale and return the machine-readable report.
+
+    Every benchmark gets a result per scale. Its status is "ok", "skipped"
+    when the full frame is over max_full_pairs, or "oom" when it ran out of
+    memory; only "ok" results have timings. Skipped full-frame results carry
+    the peak memory extrapolated from the largest measured scale, if any.
+    """
+    app_variant = load_app_variant()
+    results = []
+    # Benchmark -> peak bytes per pair of its largest measured scale
+    bytes_per_pair = {}
+
+    for n_animals, n_locations in scales:
+        land_data = generate_locations(n_locations)
+        animal_data = generate_animals(n_animals)
+        pairs = n_animals * n_locations
+
+        for name, case in benchmark_cases(land_data, animal_data, app_variant, max_full_pairs).items():
+            result = {
+                "benchmark": name,
+                "animals": n_animals,
+                "locations": n_locations,
+                "pairs": pairs,
+                "status": "ok",
+                "seconds": None,
+                "pairs_per_second": None,
+                "peak_memory_mb": None
+            }
+            results.append(result)
+
+            if case is None:
+                result["status"] = "skipped"
+                if name in bytes_per_pair:
+                    result["peak_memory_mb"] = round(bytes_per_pair[name] * pairs / 2**20, 2)
+                    result["peak_memory_estimated"] = True
+                print(f"{name:32s} {n_animals:>6} x {n_locations:<8} skipped, over {max_full_pairs} pairs")
+                continue
+            try:
+                seconds, peak = measure(case, repeat, trace_memory)
+            except MemoryError:
+                tracemalloc.stop()
+                result["status"] = "oom"
+                print(f"{name:32s} {n_animals:>6} x {n_locations:<8} out of memory")
+                continue
+
+            result["seconds"] = round(seconds, 4)
+            result["pairs_per_second"] = round(pairs / seconds) if seconds else None
+            if peak is not None:
+                result["peak_memory_mb"] = round(peak / 2**20, 2)
+                bytes_per_pair[name] = peak / pairs
+            memory = f"{peak / 2**20:10.1f} MB" if peak is not None else ""
+            print(f"{name:32s} {n_animals:>6} x {n_locations:<8} {seconds:9.3f} s {memory}")
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeat": repeat,
+        "max_full_pairs": max_full_pairs,
+        "results": results
+    }
+
+def compare(report, baseline, tolerance):
+    """
+    List the benchmarks that got slower than the baseline by more than tolerance.
+    """
+    key = lambda r: (r["benchmark"], r["animals"], r["locations"])
+    previous = {key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get(key(result))
+        if before is None or before.get("seconds") is None:
+            continue
+        if result["seconds"] is None:
+            # A benchmark that ran before but is now skipped or out of memory has regressed too
+            regressions.append(f"{result['benchmark']} {result['animals']} x {result['locations']}: "
+                               f"{before['seconds']} s -> {result['status']}")
+        elif result["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append(f"{result['benchmark']} {result['animals']} x {result['locations']}: "
+                               f"{before['seconds']} s -> {result['seconds']} s")
+    return regressions
+
+def parse_scales(text):
+    """Parse '100x1000,1000x10000' into [(100, 1000), (1000, 10000)]."""
+    return [tuple(int(n) for n in scale.split("x")) for scale in text.split(",")]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the survival-matching engine")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--scales", type=parse_scales, help="Custom scales such as 100x1000,1000x10000")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--skip-memory", action="store_true", help="Only time the benchmarks")
+    parser.add_argument("--max-full-pairs", type=int, default=MAX_FULL_PAIRS,
+                        help="Largest scale, in pairs, for the full-frame benchmarks")
+    parser.add_argument("--baseline", help="Previous report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    report = run(args.scales or PRESETS[args.preset], args.repeat, not args.skip_memory, args.max_full_pairs)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,176 @@
+import gzip
+import io
+import json
+import os
+
+import pandas as pd
+import numpy as np
+
+# Manifest written next to the per-column .npy files of a columnar dataset
+MANIFEST_NAME = "columns.json"
+
+def dataset_format(path):
+    """
+    Infer the storage format of a dataset path.
+
+    Paths ending in .csv (or .csv.gz) are CSV, .parquet is Parquet, anything
+    else is a directory holding one .npy file per column.
+    """
+    path = str(path)
+    if path.endswith((".csv", ".csv.gz")):
+        return "csv"
+    if path.endswith(".parquet"):
+        return "parquet"
+    return "npy"
+
+def save_dataset(df, path, format=None):
+    """
+    Save a DataFrame as CSV, Parquet or a directory of per-column .npy files.
+
+    Parameters:
+    df (DataFrame): Data to save
+    path (str): Output file or directory
+    format (str): "csv", "parquet" or "npy", inferred from path when None
+    """
+    format = format or dataset_format(path)
+
+    if format == "csv":
+        df.to_csv(path, index=False)
+    elif format == "parquet":
+        df.to_parquet(path, index=False)
+    elif format == "npy":
+        os.makedirs(path, exist_ok=True)
+        columns = []
+        for name in df.columns:
+            values = df[name].to_numpy()
+            # Text is stored as fixed-width unicode so it can be memory-mapped too
+            if values.dtype.kind not in "biuf":
+                values = values.astype(str)
+            np.save(os.path.join(path, f"{name}.npy"), values)
+            columns.append((name, values.dtype))
+        write_manifest(path, len(df), columns)
+    else:
+        raise ValueError(f"Unknown dataset format: {format}")
+
+def write_chunks(chunks, path, format=None, compression=None):
+    """
+    Write DataFrame chunks to one CSV or Parquet file, a chunk at a time.
+
+    Only the chunk being written is held in memory, so generators of chunks
+    can be exported whatever their total size.
+
+    Parameters:
+    chunks (iterable): DataFrames with the same columns
+    path (str or file): Output path, or a binary file object such as BytesIO
+    format (str): "csv" or "parquet", inferred from path when None
+    compression (str): "gzip" for gzip-compressed CSV, None to infer from a
+        .gz path; Parquet files are always compressed by pyarrow
+
+    Returns:
+    int: Number of rows written
+    """
+    is_path = isinstance(path, (str, os.PathLike))
+    format = format or (dataset_format(path) if is_path else None)
+    rows_written = 0
+
+    if format == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet requires pyarrow: pip install pyarrow")
+
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows_written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows_written
+
+    if format != "csv":
+        raise ValueError(f"Unknown chunk format: {format}")
+
+    if compression is None and is_path and str(path).endswith(".gz"):
+        compression = "gzip"
+    binary = open(path, "wb") if is_path else path
+    try:
+        stream = gzip.GzipFile(fileobj=binary, mode="wb") if compression == "gzip" else binary
+        f = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        try:
+            for chunk in chunks:
+                chunk.to_csv(f, header=rows_written == 0, index=False)
+                rows_written += len(chunk)
+            f.flush()
+        finally:
+            # Detach so closing the wrapper never closes a caller-owned file object
+            f.detach()
+        if stream is not binary:
+            stream.close()
+    finally:
+        if is_path:
+            binary.close()
+    return rows_written
+
+def write_manifest(path, n_rows, columns):
+    """
+    Write the manifest of a .npy columnar dataset.
+
+    Parameters:
+    path (str): Dataset directory
+    n_rows (int): Number of rows in every column
+    columns (list): (name, dtype) pairs in column order, stored as <name>.npy
+    """
+    with open(os.path.join(path, MANIFEST_NAME), "w") as f:
+        json.dump({"rows": n_rows, "columns": [
+            {"name": name, "file": f"{name}.npy", "dtype": np.dtype(dtype).str} for name, dtype in columns
+        ]}, f, indent=2)
+
+def load_columns(path, mmap=True):
+    """
+    Load a .npy columnar dataset as a dict of column arrays.
+
+    Parameters:
+    path (str): Dataset directory written by save_dataset
+    mmap (bool): Memory-map the column files instead of reading them
+
+    Returns:
+    dict: Column name -> read-only array, in manifest order
+    """
+    with open(os.path.join(path, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    return {
+        column["name"]: np.load(os.path.join(path, column["file"]), mmap_mode="r" if mmap else None)
+        for column in manifest["columns"]
+    }
+
+def load_dataset(path, mmap=True, format=None):
+    """
+    Load a dataset saved as CSV, Parquet or per-column .npy files.
+
+    Numeric columns of .npy datasets are wrapped without copying, so with
+    mmap=True the data is paged in from disk only as the scoring engine reads
+    it. Parquet files are memory-mapped by pyarrow.
+
+    Parameters:
+    path (str): Dataset file or directory
+    mmap (bool): Memory-map the data where the format allows it
+    format (str): "csv", "parquet" or "npy", inferred from path when None
+
+    Returns:
+    DataFrame: The loaded data
+    """
+    format = format or dataset_format(path)
+
+    if format == "csv":
+        return pd.read_csv(path)
+    if format == "parquet":
+        return pd.read_parquet(path, memory_map=mmap)
+    if format == "npy":
+        return pd.DataFrame(load_columns(path, mmap), copy=False)
+    raise ValueError(f"Unknown dataset format: {format}")
@@ -0,0 +1,118 @@
+import pandas as pd
+import numpy as np
+
+from scoring import compile_criteria
+
+class ToleranceIndex:
+    """
+    Index over the animal tolerance ranges for fast single-location lookups.
+
+    For every criterion the animals are sorted by their min and by their max
+    tolerance. The animals whose range admits a value are then a prefix of
+    each sort order, found with a binary search. Prefixes are materialized as
+    packed bitsets every `stride` positions, so a query only copies one
+    checkpoint and patches at most `stride` bits per sort order before the
+    criteria bitsets are combined. Memory use is about
+    2 * C * (A / stride) * (A / 8) bytes.
+
+    Parameters:
+    animal_data (DataFrame): Animal survival condition data
+    stride (int): Distance between materialized prefix bitsets
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+    """
+
+    def __init__(self, animal_data, stride=256, criteria=None):
+        self.animal_data = animal_data.reset_index(drop=True)
+        self.animal_ids = animal_data["animal_id"].to_numpy()
+        self.animal_names = animal_data["animal_name"].to_numpy()
+        self.n_animals = len(animal_data)
+        self.stride = stride
+        self.plan = compile_criteria(criteria)
+
+        animal_min, animal_max = self.plan.animal_ranges(animal_data)
+        self._min_sorted, self._min_order, self._min_checkpoints = [], [], []
+        self._max_sorted, self._max_order, self._max_checkpoints = [], [], []
+
+        for c in range(len(self.plan)):
+            # Ascending mins: animals with min <= value are a prefix (NaN sorts last)
+            order = np.argsort(animal_min[c], kind="stable")
+            self._min_sorted.append(animal_min[c, order])
+            self._min_order.append(order)
+            self._min_checkpoints.append(self._prefix_checkpoints(order))
+
+            # Descending maxes: animals with max >= value are a prefix (NaN kept last)
+            order = np.argsort(animal_max[c], kind="stable")
+            valid = np.count_nonzero(~np.isnan(animal_max[c]))
+            order = np.concatenate([order[:valid][::-1], order[valid:]])
+            self._max_sorted.append(np.sort(animal_max[c])[:valid])
+            self._max_order.append(order)
+            self._max_checkpoints.append(self._prefix_checkpoints(order))
+
+    def _prefix_checkpoints(self, order):
+        """Packed bitsets of the first 0, stride, 2 * stride, ... animals in order."""
+        mask = np.zeros(self.n_animals, dtype=bool)
+        checkpoints = [np.packbits(mask)]
+        for start in range(0, self.n_animals - self.stride + 1, self.stride):
+            mask[order[start:start + self.stride]] = True
+            checkpoints.append(np.packbits(mask))
+        return np.stack(checkpoints)
+
+    def _prefix_bits(self, order, checkpoints, count):
+        """Packed bitset of the first `count` animals in order."""
+        checkpoint = count // self.stride
+        bits = checkpoints[checkpoint].copy()
+        rest = order[checkpoint * self.stride:count]
+        np.bitwise_or.at(bits, rest >> 3, (0x80 >> (rest & 7)).astype(np.uint8))
+        return bits
+
+    def match_percentages(self, location):
+        """
+        Compute the match percentage of every animal for a single location.
+
+        Parameters:
+        location (dict or Series): Land attributes keyed by land column name
+
+        Returns:
+        ndarray: Unrounded match percentages in animal_data order
+        """
+        criteria_bits = []
+        for c, land_col in enumerate(self.plan.land_columns):
+            value = float(location[land_col])
+            if np.isnan(value):
+                criteria_bits.append(np.zeros_like(self._min_checkpoints[c][0]))
+                continue
+            min_count = np.searchsorted(self._min_sorted[c], value, side="right")
+            max_count = len(self._max_sorted[c]) - np.searchsorted(self._max_sorted[c], value, side="left")
+            criteria_bits.append(
+                self._prefix_bits(self._min_order[c], self._min_checkpoints[c], min_count)
+                & self._prefix_bits(self._max_order[c], self._max_checkpoints[c], max_count)
+            )
+
+        matches = np.unpackbits(np.stack(criteria_bits), axis=1, count=self.n_animals)
+
+        # Pack the criteria into per-animal bitmasks and score them like calculate_survival_match
+        masks = np.zeros(self.n_animals, dtype=self.plan.mask_dtype)
+        for c in range(len(self.plan)):
+            masks |= matches[c].astype(self.plan.mask_dtype) << c
+        return self.plan.mask_scores(masks)
+
+    def query(self, location, threshold=70):
+        """
+        Find the animals that can survive in a single location.
+
+        Parameters:
+        location (dict or Series): Land attributes keyed by land column name
+        threshold (float): Minimum match percentage for an animal to survive
+
+        Returns:
+        DataFrame: Qualifying animals, best match first
+        """
+        scores = self.match_percentages(location)
+        qualifying = np.flatnonzero(scores >= threshold)
+        qualifying = qualifying[np.argsort(-np.rint(scores[qualifying] * 100), kind="stable")]
+
+        return pd.DataFrame({
+            "animal_id": self.animal_ids[qualifying],
+            "animal_name": self.animal_names[qualifying],
+            "match_percentage": scores[qualifying].round(2)
+        })
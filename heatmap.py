@@ -0,0 +1,101 @@
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+# Most cells sent to the browser along each axis of the heatmap
+MAX_HEATMAP_ROWS = 60
+MAX_HEATMAP_COLS = 80
+
+# data: DataFrame of cell values with row/column labels
+# row_order, col_order: matrix positions in display order
+# row_edges, col_edges: first display position of every block, plus the end
+HeatmapView = namedtuple("HeatmapView", ["data", "row_order", "col_order", "row_edges", "col_edges"])
+
+def display_order(scores, labels, axis, order="name"):
+    """
+    Order the rows (axis=0) or columns (axis=1) of the score matrix for display.
+
+    Parameters:
+    scores (ndarray): Match percentages of shape (A, L)
+    labels (array): Names along the axis
+    axis (int): 0 for animals, 1 for locations
+    order (str): "name" for alphabetical, "mean" for best mean match first
+
+    Returns:
+    ndarray: Matrix positions in display order
+    """
+    if order == "name":
+        return np.argsort(np.asarray(labels, dtype=str), kind="stable")
+    if order == "mean":
+        return np.argsort(-scores.mean(axis=1 - axis), kind="stable")
+    raise ValueError(f"Unknown heatmap order: {order}")
+
+def block_edges(n, max_blocks):
+    """Split n positions into at most max_blocks contiguous blocks of near-equal size."""
+    return np.unique(np.linspace(0, n, min(n, max_blocks) + 1).round().astype(int))
+
+def block_means(scores, row_order, col_order, row_edges, col_edges):
+    """
+    Average the score matrix over blocks of the display order.
+
+    Rows are gathered one block at a time, so only a block of rows is ever
+    copied instead of the whole reordered matrix.
+    """
+    row_sums = np.stack([
+        scores[row_order[start:stop]].sum(axis=0) for start, stop in zip(row_edges[:-1], row_edges[1:])
+    ])
+    sums = np.add.reduceat(row_sums[:, col_order], col_edges[:-1], axis=1)
+    return sums / np.outer(np.diff(row_edges), np.diff(col_edges))
+
+def block_labels(labels, edges):
+    """Label every block with its only name, or its first and last names and size."""
+    return [
+        str(labels[start]) if stop - start == 1 else f"{labels[start]} … {labels[stop - 1]} ({stop - start})"
+        for start, stop in zip(edges[:-1], edges[1:])
+    ]
+
+def heatmap_view(scores, animal_names, location_names, order="name", row_range=None, col_range=None,
+                 max_rows=MAX_HEATMAP_ROWS, max_cols=MAX_HEATMAP_COLS):
+    """
+    Aggregate the score matrix into a heatmap with a bounded number of cells.
+
+    Animals and locations are put in display order, the requested region is
+    selected and, when it is larger than max_rows x max_cols, it is averaged
+    over contiguous blocks. Small regions keep one cell per pair with the
+    rounded match percentage, so drilling down ends at the exact values.
+
+    Parameters:
+    scores (ndarray): Unrounded match percentages of shape (A, L)
+    animal_names (array): Name of every animal row
+    location_names (array): Name of every location column
+    order (str): "name" or "mean", see display_order
+    row_range (tuple): (start, stop) display positions of the animals to show, None for all
+    col_range (tuple): (start, stop) display positions of the locations to show, None for all
+    max_rows (int): Most heatmap rows
+    max_cols (int): Most heatmap columns
+
+    Returns:
+    HeatmapView: The cells to draw and the mapping back to the matrix, with
+    an empty data frame when a range selects no animals or locations
+    """
+    row_order = display_order(scores, animal_names, 0, order)[slice(*(row_range or (None,)))]
+    col_order = display_order(scores, location_names, 1, order)[slice(*(col_range or (None,)))]
+    if len(row_order) == 0 or len(col_order) == 0:
+        # An empty range has nothing to draw
+        return HeatmapView(pd.DataFrame(), row_order, col_order, np.zeros(1, dtype=int), np.zeros(1, dtype=int))
+    if len(row_order) <= max_rows and len(col_order) <= max_cols:
+        row_edges = np.arange(len(row_order) + 1)
+        col_edges = np.arange(len(col_order) + 1)
+        values = np.round(scores[np.ix_(row_order, col_order)], 2)
+    else:
+        row_edges = block_edges(len(row_order), max_rows)
+        col_edges = block_edges(len(col_order), max_cols)
+        values = block_means(scores, row_order, col_order, row_edges, col_edges)
+
+    data = pd.DataFrame(
+        values,
+        index=block_labels(np.asarray(animal_names)[row_order], row_edges),
+        columns=block_labels(np.asarray(location_names)[col_order], col_edges)
+    )
+    return HeatmapView(data, row_order, col_order, row_edges, col_edges)
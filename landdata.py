@@ -1,6 +1,15 @@
+import argparse
+
 import pandas as pd
 import numpy as np
 
+from datasets import save_dataset
+
+parser = argparse.ArgumentParser(description="Generate the land geographical data dataset")
+parser.add_argument("--format", choices=["csv", "npy", "parquet"], default="csv",
+                    help="Output format: CSV, one .npy file per column, or Parquet")
+args = parser.parse_args()
+
 # Set random seed for reproducibility
 np.random.seed(42)
 
@@ -35,5 +44,6 @@ land_data.loc[land_data['location_name'] == 'Wetlands', 'water_availability'] =
 print("Land Geographical Data:")
 print(land_data)
 
-# Save to CSV
-land_data.to_csv('land_geographical_data.csv', index=False)
\ No newline at end of file
+# Save to CSV, or to a binary columnar dataset that loads memory-mapped
+output_paths = {"csv": 'land_geographical_data.csv', "npy": 'land_geographical_data', "parquet": 'land_geographical_data.parquet'}
+save_dataset(land_data, output_paths[args.format])
\ No newline at end of file
@@ -0,0 +1,206 @@
+import argparse
+import gzip
+import json
+import os
+
+import numpy as np
+
+from datasets import load_dataset
+from scoring import compile_criteria
+
+# Written next to the per-species tile directories of a suitability raster
+RASTER_MANIFEST_NAME = "manifest.json"
+
+# Tiles store match percentages in hundredths, which compress far better than floats
+TILE_DTYPE = np.uint16
+TILE_SCALE = 100
+
+def save_layers(layers, path):
+    """
+    Save gridded land layers as one 2-D .npy file per land column.
+
+    Parameters:
+    layers (dict): Land column name -> 2-D array, all of the same shape
+    path (str): Output directory
+    """
+    os.makedirs(path, exist_ok=True)
+    for column, grid in layers.items():
+        np.save(os.path.join(path, f"{column}.npy"), np.asarray(grid))
+
+def load_layers(path, criteria=None, mmap=True):
+    """
+    Load the land layers a criteria set needs from a directory of .npy grids.
+
+    Parameters:
+    path (str): Directory written by save_layers
+    criteria (list or CriteriaPlan): Criteria to score, None for the defaults
+    mmap (bool): Memory-map the grids instead of reading them
+
+    Returns:
+    dict: Land column name -> 2-D array
+    """
+    plan = compile_criteria(criteria)
+    missing = [col for col in plan.land_columns if not os.path.exists(os.path.join(path, f"{col}.npy"))]
+    if missing:
+        raise KeyError(f"Missing criteria columns: {', '.join(missing)}")
+    return {
+        col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r" if mmap else None)
+        for col in plan.land_columns
+    }
+
+def raster_shape(layers, criteria=None):
+    """Return the common (rows, cols) shape of the layers, raising ValueError on a mismatch."""
+    plan = compile_criteria(criteria)
+    shapes = {col: np.shape(layers[col]) for col in plan.land_columns if col in layers}
+    if len(set(shapes.values())) > 1:
+        raise ValueError(f"Land layers must share one shape, got {shapes}")
+    shape = next(iter(shapes.values()), None)
+    if shape is None or len(shape) != 2:
+        raise ValueError("Land layers must be 2-D grids")
+    return shape
+
+def iter_tiles(shape, tile_size=256):
+    """
+    Split a grid into square tiles, row by row.
+
+    Yields:
+    tuple: (tile_row, tile_col, row slice, col slice)
+    """
+    n_rows, n_cols = shape
+    for tile_row, top in enumerate(range(0, n_rows, tile_size)):
+        for tile_col, left in enumerate(range(0, n_cols, tile_size)):
+            yield tile_row, tile_col, slice(top, min(top + tile_size, n_rows)), slice(left, min(left + tile_size, n_cols))
+
+def iter_suitability_tiles(layers, animal_data, tile_size=256, species_batch=256, criteria=None):
+    """
+    Compute the suitability of every grid cell for every species, tile by tile.
+
+    Only one tile of every layer is read at a time, so memory-mapped grids
+    far larger than RAM can be scored. Cells are scored exactly like the
+    locations of algorithm.calculate_survival_match; a NaN cell value never
+    matches its criterion.
+
+    Memory grows with species_batch * tile_size ** 2 cells. Each batch
+    yields float64 scores (8 bytes per cell), computed from a bitmask of 1
+    byte per cell for up to 8 criteria, while the caller usually still
+    holds the previous batch. With the default criteria the peak is about
+    18 * species_batch * tile_size ** 2 bytes, some 300 MB at the default
+    tile_size and species_batch; criteria sets past
+    scoring.MAX_TABLE_CRITERIA need more scratch space.
+
+    Parameters:
+    layers (dict): Land column name -> 2-D array, see load_layers
+    animal_data (DataFrame): Animal survival condition data
+    tile_size (int): Rows and columns per tile
+    species_batch (int): Species scored together
+    criteria (list or CriteriaPlan): Criteria to score, None for the defaults
+
+    Yields:
+    tuple: (tile_row, tile_col, first species position, unrounded match percentages of shape (species, rows, cols))
+    """
+    plan = compile_criteria(criteria)
+    shape = raster_shape(layers, plan)
+    animal_min, animal_max = plan.animal_ranges(animal_data)
+
+    for tile_row, tile_col, rows, cols in iter_tiles(shape, tile_size):
+        tile = {col: np.asarray(layers[col][rows, cols]).ravel() for col in plan.land_columns}
+        land_values = plan.land_values(tile)
+        tile_shape = (rows.stop - rows.start, cols.stop - cols.start)
+        for start in range(0, len(animal_data), species_batch):
+            batch = slice(start, start + species_batch)
+            scores = plan.scores(land_values, animal_min[:, batch], animal_max[:, batch])
+            yield tile_row, tile_col, start, scores.reshape(-1, *tile_shape)
+
+def tile_path(path, animal_id, tile_row, tile_col):
+    """Path of one compressed suitability tile."""
+    return os.path.join(path, str(animal_id), f"{tile_row}_{tile_col}.npy.gz")
+
+def write_suitability_rasters(layers, animal_data, path, tile_size=256, species_batch=256, criteria=None,
+                              compresslevel=1):
+    """
+    Write a gzip-compressed suitability raster per species, tile by tile.
+
+    Every species gets a directory named after its animal_id holding one
+    <tile_row>_<tile_col>.npy.gz file per tile. Tiles hold match percentages
+    in hundredths as uint16 (divide by TILE_SCALE for the percentage rounded
+    to 2 decimals). Map clients fetch only the tiles in view; manifest.json
+    describes the grid, tiling and species.
+
+    Parameters:
+    layers (dict): Land column name -> 2-D array, see load_layers
+    animal_data (DataFrame): Animal survival condition data
+    path (str): Output directory
+    tile_size (int): Rows and columns per tile
+    species_batch (int): Species scored together per tile
+    criteria (list or CriteriaPlan): Criteria to score, None for the defaults
+    compresslevel (int): gzip compression level
+
+    Returns:
+    dict: The manifest
+    """
+    plan = compile_criteria(criteria)
+    shape = raster_shape(layers, plan)
+    animal_ids = [str(animal_id) for animal_id in animal_data["animal_id"].tolist()]
+    if len(set(animal_ids)) != len(animal_ids):
+        raise ValueError("animal_id values must be unique to name the species directories")
+
+    for animal_id in animal_ids:
+        os.makedirs(os.path.join(path, animal_id), exist_ok=True)
+
+    for tile_row, tile_col, start, scores in iter_suitability_tiles(layers, animal_data, tile_size, species_batch, plan):
+        for offset, species_scores in enumerate(scores):
+            with gzip.open(tile_path(path, animal_ids[start + offset], tile_row, tile_col), "wb",
+                           compresslevel=compresslevel) as f:
+                np.save(f, np.rint(species_scores * TILE_SCALE).astype(TILE_DTYPE))
+
+    manifest = {
+        "shape": list(shape),
+        "tile_size": tile_size,
+        "tiles": [-(-shape[0] // tile_size), -(-shape[1] // tile_size)],
+        "dtype": np.dtype(TILE_DTYPE).name,
+        "scale": TILE_SCALE,
+        "criteria": plan.names,
+        "species": [
+            {"animal_id": animal_id, "animal_name": str(name)}
+            for animal_id, name in zip(animal_ids, animal_data["animal_name"].tolist())
+        ]
+    }
+    with open(os.path.join(path, RASTER_MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def read_suitability_tile(path, animal_id, tile_row, tile_col):
+    """Load one suitability tile written by write_suitability_rasters as match percentages."""
+    with gzip.open(tile_path(path, animal_id, tile_row, tile_col), "rb") as f:
+        return np.load(f) / TILE_SCALE
+
+def read_suitability_raster(path, animal_id):
+    """
+    Assemble the full suitability raster of one species from its tiles.
+
+    Parameters:
+    path (str): Directory written by write_suitability_rasters
+    animal_id: Species to load
+
+    Returns:
+    ndarray: Match percentages of shape (rows, cols)
+    """
+    with open(os.path.join(path, RASTER_MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    raster = np.empty(manifest["shape"])
+    for tile_row, tile_col, rows, cols in iter_tiles(manifest["shape"], manifest["tile_size"]):
+        raster[rows, cols] = read_suitability_tile(path, animal_id, tile_row, tile_col)
+    return raster
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute per-species suitability rasters from gridded land layers")
+    parser.add_argument("--layers", required=True, help="Directory with one 2-D .npy grid per land column")
+    parser.add_argument("--animals", default="animal_survival_conditions.csv")
+    parser.add_argument("--output", default="suitability_rasters")
+    parser.add_argument("--tile-size", type=int, default=256)
+    args = parser.parse_args()
+
+    manifest = write_suitability_rasters(load_layers(args.layers), load_dataset(args.animals), args.output,
+                                         tile_size=args.tile_size)
+    print(f"Wrote {len(manifest['species'])} suitability rasters of {manifest['shape'][0]} x "
+          f"{manifest['shape'][1]} cells to {args.output}")
@@ -0,0 +1,211 @@
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+from scoring import compile_criteria
+
+# A change to one land column: operation "add" adds value, "scale" multiplies by value
+Perturbation = namedtuple("Perturbation", ["column", "operation", "value"])
+
+# A named climate scenario, its perturbations are applied in order
+Scenario = namedtuple("Scenario", ["name", "perturbations"])
+
+OPERATIONS = ("add", "scale")
+
+def scenario_grid(column, operation, values, name_format="{column} {operation} {value:g}"):
+    """
+    Build one single-perturbation scenario per value, e.g. a temperature sweep.
+
+    Parameters:
+    column (str): Land column to perturb
+    operation (str): "add" or "scale"
+    values (iterable): Amounts to add or factors to scale by
+    name_format (str): Scenario name, formatted with column, operation and value
+
+    Returns:
+    list: Scenario tuples
+    """
+    return [
+        Scenario(name_format.format(column=column, operation=operation, value=value),
+                 [Perturbation(column, operation, value)])
+        for value in values
+    ]
+
+def _compile_scenarios(scenarios, plan):
+    """Validate scenarios and map their columns to criteria positions."""
+    scenarios = [
+        Scenario(name, [Perturbation(*perturbation) for perturbation in perturbations])
+        for name, perturbations in scenarios
+    ]
+    criteria_of_column = {}
+    for c, land_col in enumerate(plan.land_columns):
+        criteria_of_column.setdefault(land_col, []).append(c)
+
+    for scenario in scenarios:
+        for column, operation, value in scenario.perturbations:
+            if column not in criteria_of_column:
+                raise KeyError(f"Scenario {scenario.name!r} perturbs {column!r}, which no criterion uses")
+            if operation not in OPERATIONS:
+                raise ValueError(f"Unknown perturbation operation {operation!r}, expected one of {OPERATIONS}")
+    return scenarios, criteria_of_column
+
+def _survives(plan, masks, threshold):
+    """Survival of every pair from its criteria bitmask."""
+    if plan.pattern_scores is not None:
+        return (plan.pattern_scores >= threshold)[masks]
+    return plan.mask_scores(masks) >= threshold
+
+def _perturb(values, perturbations):
+    """Apply (operation, value) perturbations in order to land values."""
+    for operation, value in perturbations:
+        values = values + value if operation == "add" else values * value
+    return values
+
+def _unperturb(bounds, perturbations):
+    """Map tolerance bounds back through the perturbations, approximately inverting _perturb."""
+    for operation, value in reversed(perturbations):
+        bounds = bounds - value if operation == "add" else bounds / value
+    return bounds
+
+def _ragged_ranges(starts, stops):
+    """Row numbers and positions of the concatenated ranges starts[i]:stops[i]."""
+    lengths = np.maximum(stops - starts, 0)
+    rows = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return rows, np.repeat(starts, lengths) + offsets
+
+def _candidate_pairs(sorted_values, order, animal_min, animal_max, perturbations):
+    """
+    Pairs whose match on one criterion may flip under a column's perturbations.
+
+    A location matches when its value lies in [min, max], and after the
+    perturbation when it lies in the mapped-back interval. Only values
+    between the old and new lower bounds, or the old and new upper bounds,
+    can flip. The new bounds are only approximate, so both regions are
+    widened around them and the resulting superset is re-tested exactly.
+
+    Returns:
+    tuple: (animal positions, location positions)
+    """
+    scale = max(1.0, *(abs(value) for _, value in perturbations))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        new_bounds = np.sort(np.stack([_unperturb(animal_min, perturbations),
+                                       _unperturb(animal_max, perturbations)]), axis=0)
+        tolerance = 1e-9 * (np.abs(new_bounds) + scale)
+    tolerance[~np.isfinite(tolerance)] = 0
+
+    animals, locations = [], []
+    for old, new, margin in ((animal_min, new_bounds[0], tolerance[0]), (animal_max, new_bounds[1], tolerance[1])):
+        low, high = np.fmin(old, new - margin), np.fmax(old, new + margin)
+        rows, positions = _ragged_ranges(np.searchsorted(sorted_values, low, side="left"),
+                                         np.searchsorted(sorted_values, high, side="right"))
+        animals.append(rows)
+        locations.append(order[positions])
+    return np.concatenate(animals), np.concatenate(locations)
+
+def evaluate_scenarios(land_data, animal_data, scenarios, threshold=70, chunk_size=1_000_000, criteria=None):
+    """
+    Evaluate climate scenarios against the same animal table in one batched pass.
+
+    Locations are processed in blocks. Each block is scored once into
+    criteria bitmasks, and every perturbed column is sorted once. A scenario
+    then only re-tests the pairs whose value lies near an animal's tolerance
+    bound (found by binary search in the sorted column) instead of copying
+    the land data and rescoring every pair, so small perturbations cost far
+    less than a full scoring pass. Survival is decided exactly like
+    calculate_survival_match on the perturbed data.
+
+    Parameters:
+    land_data (DataFrame): Land geographical data
+    animal_data (DataFrame): Animal survival condition data
+    scenarios (list): Scenario tuples (name, [(column, "add" or "scale", value), ...])
+    threshold (float): Minimum match percentage for an animal to survive
+    chunk_size (int): Maximum number of animal-location pairs per block
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
+    Returns:
+    DataFrame: One row per scenario and animal with baseline_habitats,
+    scenario_habitats, gained, lost and net_change location counts
+    """
+    plan = compile_criteria(criteria)
+    if plan.mask_dtype is None:
+        raise ValueError("Scenario evaluation supports at most 64 criteria")
+    scenarios, criteria_of_column = _compile_scenarios(scenarios, plan)
+
+    animal_min, animal_max = plan.animal_ranges(animal_data)
+    n_animals, n_scenarios = len(animal_data), len(scenarios)
+    block_size = max(1, chunk_size // max(1, n_animals))
+
+    baseline = np.zeros(n_animals, dtype=np.int64)
+    gained = np.zeros((n_scenarios, n_animals), dtype=np.int64)
+    lost = np.zeros((n_scenarios, n_animals), dtype=np.int64)
+
+    for start in range(0, len(land_data), block_size):
+        land_values = plan.land_values(land_data.iloc[start:start + block_size])
+        n_locations = land_values.shape[1]
+        masks = plan.masks(land_values, animal_min, animal_max)
+        base_survives = _survives(plan, masks, threshold)
+        baseline += base_survives.sum(axis=1)
+        sorted_columns = {}
+        # Marks candidate pairs, deduplicating them without a sort
+        is_candidate = np.zeros(masks.size, dtype=bool)
+
+        for s, scenario in enumerate(scenarios):
+            by_column = {}
+            for column, operation, value in scenario.perturbations:
+                by_column.setdefault(column, []).append((operation, value))
+
+            # Candidate pairs near a tolerance bound of any perturbed criterion
+            candidates = []
+            for column, perturbations in by_column.items():
+                values = land_values[criteria_of_column[column][0]]
+                if column not in sorted_columns:
+                    order = np.argsort(values, kind="stable")
+                    # NaN values sort last and never match, before or after
+                    valid = np.count_nonzero(~np.isnan(values))
+                    sorted_columns[column] = (values[order[:valid]], order[:valid])
+                sorted_values, order = sorted_columns[column]
+                for c in criteria_of_column[column]:
+                    if any(operation == "scale" and value == 0 for operation, value in perturbations):
+                        # A zero factor maps every value to 0, re-test all pairs
+                        rows, positions = _ragged_ranges(np.zeros(n_animals, dtype=np.int64),
+                                                         np.full(n_animals, len(order)))
+                        candidates.append(rows * n_locations + order[positions])
+                    else:
+                        animals, locations = _candidate_pairs(sorted_values, order, animal_min[c], animal_max[c],
+                                                              perturbations)
+                        candidates.append(animals * n_locations + locations)
+            if not candidates:
+                continue
+            for pairs in candidates:
+                is_candidate[pairs] = True
+            pairs = np.flatnonzero(is_candidate)
+            is_candidate[pairs] = False
+            animals, locations = np.divmod(pairs, n_locations)
+
+            # Re-test the perturbed criteria of the candidate pairs exactly
+            pair_masks = masks[animals, locations]
+            for column, perturbations in by_column.items():
+                values = _perturb(land_values[criteria_of_column[column][0]][locations], perturbations)
+                for c in criteria_of_column[column]:
+                    in_range = (animal_min[c, animals] <= values) & (values <= animal_max[c, animals])
+                    pair_masks &= ~plan.mask_dtype.type(1 << c)
+                    pair_masks |= in_range.astype(plan.mask_dtype) << plan.mask_dtype.type(c)
+
+            survives = _survives(plan, pair_masks, threshold)
+            survived = base_survives[animals, locations]
+            gained[s] += np.bincount(animals[survives & ~survived], minlength=n_animals)
+            lost[s] += np.bincount(animals[survived & ~survives], minlength=n_animals)
+
+    habitats = baseline + gained - lost
+    return pd.DataFrame({
+        "scenario": np.repeat([scenario.name for scenario in scenarios], n_animals),
+        "animal_id": np.tile(animal_data["animal_id"].to_numpy(), n_scenarios),
+        "animal_name": np.tile(animal_data["animal_name"].to_numpy(), n_scenarios),
+        "baseline_habitats": np.tile(baseline, n_scenarios),
+        "scenario_habitats": habitats.ravel(),
+        "gained": gained.ravel(),
+        "lost": lost.ravel(),
+        "net_change": (habitats - baseline).ravel()
+    })
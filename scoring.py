@@ -0,0 +1,187 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Criterion name, land column, animal min column (None for max-only), animal max column, weight
+Criterion = namedtuple("Criterion", ["name", "land_column", "min_column", "max_column", "weight"])
+
+DEFAULT_CRITERIA = [
+    Criterion("Temperature", "avg_temperature_c", "min_temperature_c", "max_temperature_c", 0.15),
+    Criterion("Rainfall", "annual_rainfall_mm", "min_rainfall_mm", "max_rainfall_mm", 0.15),
+    Criterion("Elevation", "elevation_m", "min_elevation_m", "max_elevation_m", 0.10),
+    Criterion("Humidity", "humidity_percent", "min_humidity_percent", "max_humidity_percent", 0.10),
+    Criterion("Vegetation", "vegetation_density", "min_vegetation_density", "max_vegetation_density", 0.15),
+    Criterion("Water", "water_availability", "min_water_availability", "max_water_availability", 0.15),
+    Criterion("Soil", "soil_quality", "min_soil_quality", "max_soil_quality", 0.10),
+    Criterion("Predators", "predator_density", None, "max_predator_density", 0.10)
+]
+
+# Criteria sets up to this size get a lookup table with the score of every bitmask
+MAX_TABLE_CRITERIA = 16
+
+class CriteriaPlan:
+    """
+    A criteria table compiled once for the vectorized scoring engine.
+
+    The plan holds the land and animal column names in criterion order, the
+    weight vector and the normalizer, plus the bitmask dtype and the score of
+    every bitmask when the criteria set is small enough. Arrays produced by a
+    plan are criterion-major: land values are (C x L) and animal ranges
+    (C x A), so every criterion is a contiguous row.
+
+    Parameters:
+    criteria (list): Criterion tuples (name, land column, min column, max column, weight)
+    """
+
+    def __init__(self, criteria=DEFAULT_CRITERIA):
+        self.criteria = tuple(Criterion(*criterion) for criterion in criteria)
+        if not self.criteria:
+            raise ValueError("At least one criterion is required")
+
+        self.names = [c.name for c in self.criteria]
+        self.land_columns = [c.land_column for c in self.criteria]
+        self.min_columns = [c.min_column for c in self.criteria]
+        self.max_columns = [c.max_column for c in self.criteria]
+        self.weights = np.array([c.weight for c in self.criteria], dtype=float)
+
+        # Summed in criterion order, like the original per-pair loop
+        total_weight = 0
+        for weight in self.weights:
+            total_weight += weight
+        if total_weight <= 0:
+            raise ValueError("Criteria weights must add up to a positive number")
+        self.total_weight = total_weight
+
+        n_criteria = len(self.criteria)
+        self.mask_dtype = np.min_scalar_type((1 << n_criteria) - 1) if n_criteria <= 64 else None
+        self.pattern_scores = None
+        if n_criteria <= MAX_TABLE_CRITERIA:
+            self.pattern_scores = self.mask_scores(np.arange(1 << n_criteria))
+
+    def __len__(self):
+        return len(self.criteria)
+
+    def normalize(self, weighted_match_sum):
+        """Convert weighted match sums into match percentages."""
+        return (weighted_match_sum / self.total_weight) * 100
+
+    def land_values(self, land_data):
+        """
+        Extract the land criteria columns.
+
+        Parameters:
+        land_data (DataFrame or mapping): Land data, or a mapping of column arrays
+
+        Returns:
+        ndarray: Land values of shape (C, L)
+        """
+        _require_columns(land_data, self.land_columns)
+        return np.stack([np.asarray(land_data[col], dtype=float) for col in self.land_columns])
+
+    def animal_ranges(self, animal_data):
+        """
+        Extract the animal tolerance ranges.
+
+        Parameters:
+        animal_data (DataFrame or mapping): Animal data, or a mapping of column arrays
+
+        Returns:
+        tuple: (animal_min, animal_max), both of shape (C, A)
+        """
+        _require_columns(animal_data, [col for col in self.min_columns if col is not None] + self.max_columns)
+        n_animals = len(animal_data[self.max_columns[0]])
+        # Criteria without a minimum (predator density) only check the max
+        animal_min = np.stack([
+            np.asarray(animal_data[col], dtype=float) if col is not None else np.full(n_animals, -np.inf)
+            for col in self.min_columns
+        ])
+        animal_max = np.stack([np.asarray(animal_data[col], dtype=float) for col in self.max_columns])
+        return animal_min, animal_max
+
+    def masks(self, land_values, animal_min, animal_max):
+        """
+        Pack the per-criterion matches of every pair into one bitmask.
+
+        Bit c of a mask is set when criterion c matched, so the 8 default
+        criteria fit in a single uint8 per pair.
+
+        Returns:
+        ndarray: Bitmasks of shape (A, L)
+        """
+        if self.mask_dtype is None:
+            raise ValueError("Bitmasks support at most 64 criteria")
+
+        shape = (animal_min.shape[1], land_values.shape[1])
+        masks = np.zeros(shape, dtype=self.mask_dtype)
+        # Scratch buffers reused by every criterion
+        in_range = np.empty(shape, dtype=bool)
+        below_max = np.empty(shape, dtype=bool)
+        bits = np.empty(shape, dtype=self.mask_dtype)
+
+        for c in range(len(self.criteria)):
+            location_value = land_values[c]
+            np.less_equal(animal_min[c, :, None], location_value, out=in_range)
+            np.less_equal(location_value, animal_max[c, :, None], out=below_max)
+            in_range &= below_max
+            np.left_shift(in_range, c, out=bits, dtype=self.mask_dtype)
+            masks |= bits
+
+        return masks
+
+    def mask_scores(self, masks):
+        """
+        Convert criteria bitmasks into unrounded match percentages.
+
+        Small criteria sets look the masks up in pattern_scores; otherwise the
+        weights of the set bits are accumulated in criterion order.
+        """
+        if self.pattern_scores is not None:
+            return self.pattern_scores[masks]
+
+        weighted_match_sum = np.zeros(np.shape(masks))
+        for c, weight in enumerate(self.weights):
+            weighted_match_sum += ((masks >> c) & 1) * weight
+        return self.normalize(weighted_match_sum)
+
+    def scores(self, land_values, animal_min, animal_max):
+        """
+        Compute the match percentage of every animal-location pair.
+
+        The result is bit-for-bit the weighted sum of the original per-pair loop.
+
+        Returns:
+        ndarray: Unrounded match percentages of shape (A, L)
+        """
+        if self.mask_dtype is not None:
+            return self.mask_scores(self.masks(land_values, animal_min, animal_max))
+
+        weighted_match_sum = np.zeros((animal_min.shape[1], land_values.shape[1]))
+        for c, weight in enumerate(self.weights):
+            location_value = land_values[c]
+            matches = (animal_min[c, :, None] <= location_value) & (location_value <= animal_max[c, :, None])
+            weighted_match_sum += matches * weight
+        return self.normalize(weighted_match_sum)
+
+def _require_columns(data, columns):
+    """Raise a KeyError naming every criteria column missing from data."""
+    missing = [col for col in columns if col not in data]
+    if missing:
+        raise KeyError(f"Missing criteria columns: {', '.join(missing)}")
+
+DEFAULT_PLAN = CriteriaPlan(DEFAULT_CRITERIA)
+
+def compile_criteria(criteria=None):
+    """
+    Return a CriteriaPlan for criteria, reusing the precompiled default plan.
+
+    Parameters:
+    criteria (list or CriteriaPlan): Criteria to compile, None for the defaults
+
+    Returns:
+    CriteriaPlan: The compiled plan
+    """
+    if criteria is None:
+        return DEFAULT_PLAN
+    if isinstance(criteria, CriteriaPlan):
+        return criteria
+    return CriteriaPlan(criteria)
@@ -0,0 +1,316 @@
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+import algorithm
+from scoring import compile_criteria
+
+# Pairs handled at once when scanning the bitmask matrix
+_BLOCK_CELLS = 1 << 22
+
+# thresholds: every distinct rounded match percentage, ascending
+# species_histogram, location_histogram: pairs per animal / location and rounded match percentage
+# curve: survival statistics for a threshold at each of the thresholds
+# pattern_counts: pairs per criteria bitmask, for exact counts at any threshold
+ThresholdSweep = namedtuple("ThresholdSweep",
+                            ["thresholds", "species_histogram", "location_histogram", "curve", "pattern_counts"])
+
+def weighting_matrix(weights, criteria=None):
+    """
+    Validate a batch of weightings against a criteria set.
+
+    Parameters:
+    weights (array or DataFrame): (W x C) weights in criterion order, or a
+        DataFrame with one column per criterion name
+    criteria (list or CriteriaPlan): Criteria the weights apply to, None for the defaults
+
+    Returns:
+    ndarray: Weights of shape (W, C)
+    """
+    plan = compile_criteria(criteria)
+    if isinstance(weights, pd.DataFrame):
+        missing = [name for name in plan.names if name not in weights.columns]
+        if missing:
+            raise KeyError(f"Missing criteria weights: {', '.join(missing)}")
+        weights = weights[plan.names]
+    weights = np.atleast_2d(np.asarray(weights, dtype=float))
+    if weights.ndim != 2 or weights.shape[1] != len(plan):
+        raise ValueError(f"Expected weightings of {len(plan)} criteria, got shape {weights.shape}")
+    return weights
+
+def weight_pattern_scores(weights, criteria=None):
+    """
+    Score every criteria bitmask under every weighting.
+
+    The (2^C x C) bit matrix of all masks is multiplied with the weights one
+    criterion at a time, in criterion order, so every weighting scores
+    bit-for-bit like calculate_survival_match with those weights.
+
+    Parameters:
+    weights (array or DataFrame): Batch of W weightings, see weighting_matrix
+    criteria (list or CriteriaPlan): Criteria the weights apply to, None for the defaults
+
+    Returns:
+    ndarray: Unrounded match percentages of shape (W, 2^C)
+    """
+    plan = compile_criteria(criteria)
+    weights = weighting_matrix(weights, plan)
+    if plan.pattern_scores is None:
+        raise ValueError("Weight sweeps support criteria sets with at most 16 criteria")
+
+    patterns = np.arange(len(plan.pattern_scores))
+    weighted_match_sum = np.zeros((len(weights), len(patterns)))
+    total_weight = np.zeros((len(weights), 1))
+    for c in range(len(plan)):
+        weighted_match_sum += ((patterns >> c) & 1) * weights[:, c, None]
+        total_weight += weights[:, c, None]
+    if np.any(total_weight <= 0):
+        raise ValueError("Criteria weights must add up to a positive number")
+    return (weighted_match_sum / total_weight) * 100
+
+def _pattern_levels(pattern_scores):
+    """
+    Rank the distinct rounded scores of a pattern table.
+
+    Patterns with the same rounded match percentage are ties, like in
+    algorithm.top_k_indices, and share a level.
+
+    Returns:
+    tuple: (number of levels, level of every pattern, 0 = worst)
+    """
+    levels, level_of_pattern = np.unique(np.rint(pattern_scores * 100), return_inverse=True)
+    return len(levels), level_of_pattern.astype(np.min_scalar_type(len(levels)))
+
+def _level_counts(pattern_counts, level_of_pattern, n_levels):
+    """Sum per-animal pattern counts (A x 2^C) into per-animal level counts (A x levels)."""
+    level_counts = np.zeros((len(pattern_counts), n_levels), dtype=np.int64)
+    np.add.at(level_counts.T, level_of_pattern, pattern_counts.T)
+    return level_counts
+
+def _average_ranks(level_counts):
+    """Average rank (1 = worst) of a location at every level, per animal."""
+    below = np.cumsum(level_counts, axis=1) - level_counts
+    return below + (level_counts + 1) / 2
+
+def _top_k_levels(masks, level_of_pattern, level_counts, k):
+    """
+    Positions of the k best locations per animal, ties to the earlier position.
+
+    The level counts give every animal's cutoff level and how many of its
+    locations lie above it, so no partial sort of the scores is needed: rows
+    with locations above the cutoff are scanned for them, and the earliest
+    locations at the cutoff are found by scanning column chunks from the left
+    until every row has k. Matches algorithm.top_k_indices on the
+    corresponding scores.
+    """
+    n_rows, n_cols = masks.shape
+    if k == 0:
+        return np.empty((n_rows, 0), dtype=np.int64)
+
+    rows = np.arange(n_rows)
+    at_or_above = np.cumsum(level_counts[:, ::-1], axis=1)[:, ::-1]
+    cutoff = ((at_or_above >= k).sum(axis=1) - 1).astype(level_of_pattern.dtype)
+    n_above = at_or_above[rows, cutoff] - level_counts[rows, cutoff]
+    scan_cols = max(1, _BLOCK_CELLS // max(1, n_rows))
+
+    picked_rows, picked_cols = [], []
+    for row in np.flatnonzero(n_above):
+        cols = np.flatnonzero(level_of_pattern[masks[row]] > cutoff[row])
+        picked_rows.append(np.full(len(cols), row))
+        picked_cols.append(cols)
+
+    remaining = k - n_above
+    for left in range(0, n_cols, scan_cols):
+        pending = np.flatnonzero(remaining)
+        if not len(pending):
+            break
+        at_cutoff = level_of_pattern[masks[pending, left:left + scan_cols]] == cutoff[pending, None]
+        first = np.cumsum(at_cutoff, axis=1, dtype=np.int32) <= remaining[pending, None]
+        block_rows, block_cols = np.nonzero(at_cutoff & first)
+        picked_rows.append(pending[block_rows])
+        picked_cols.append(block_cols + left)
+        remaining[pending] -= np.minimum(at_cutoff.sum(axis=1), remaining[pending])
+
+    picked_rows = np.concatenate(picked_rows)
+    picked_cols = np.concatenate(picked_cols)
+    picked_levels = level_of_pattern[masks[picked_rows, picked_cols]]
+    order = np.lexsort((picked_cols, -picked_levels.astype(np.int64), picked_rows))
+    return picked_cols[order].reshape(n_rows, k)
+
+def pattern_histogram(masks, n_patterns):
+    """
+    Count the criteria patterns in every row of a bitmask matrix.
+
+    Parameters:
+    masks (ndarray): Criteria bitmasks of shape (A, L)
+    n_patterns (int): Number of possible bitmasks, 2^C
+
+    Returns:
+    ndarray: Pattern counts of shape (A, n_patterns)
+    """
+    counts = np.zeros((len(masks), n_patterns), dtype=np.int64)
+    for row, row_masks in enumerate(masks):
+        counts[row] = np.bincount(row_masks, minlength=n_patterns)
+    return counts
+
+def _weighted_correlation(x, y, weights):
+    """Row-wise Pearson correlation of x and y, weighting every column."""
+    total = weights.sum(axis=1, keepdims=True)
+    x = x - (x * weights).sum(axis=1, keepdims=True) / total
+    y = y - (y * weights).sum(axis=1, keepdims=True) / total
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (x * y * weights).sum(axis=1) / np.sqrt((x * x * weights).sum(axis=1) * (y * y * weights).sum(axis=1))
+
+def sweep_weights(land_data, animal_data, weights, k=5, baseline=None, criteria=None):
+    """
+    Evaluate a batch of criteria weightings with a single matching pass.
+
+    The criteria bitmasks of all pairs and each animal's histogram of
+    criteria patterns are computed once. Each weighting then only ranks its
+    pattern scores (see weight_pattern_scores): the histogram gives every
+    animal's top-k cutoff and rank correlation, and one byte-sized lookup
+    per pair finds the top k locations. Rank stability against the baseline
+    weighting is summarized per weighting:
+
+    - top1_agreement: share of animals whose best location is unchanged
+    - topk_overlap: mean share of the baseline top k kept in the top k
+    - spearman: mean Spearman correlation of each animal's location ranking,
+      computed exactly from the per-animal histogram of criteria patterns
+
+    Parameters:
+    land_data (DataFrame): Land geographical data
+    animal_data (DataFrame): Animal survival condition data
+    weights (array or DataFrame): Batch of W weightings, see weighting_matrix
+    k (int): Number of top locations ranked per animal and weighting
+    baseline (array): Reference weighting, None for the criteria's own weights
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+
+    Returns:
+    tuple: (rankings DataFrame with k rows per weighting and animal,
+            stability DataFrame with one row per weighting)
+    """
+    plan = compile_criteria(criteria)
+    weights = weighting_matrix(weights, plan)
+    baseline = plan.weights if baseline is None else baseline
+    if len(weights) == 0:
+        return (
+            pd.DataFrame(columns=["weighting", "animal_id", "animal_name", "rank", "location_id", "location_name",
+                                  "match_percentage"]),
+            pd.DataFrame(columns=["weighting", *plan.names, "top1_agreement", "topk_overlap", "spearman"])
+        )
+    pattern_scores = weight_pattern_scores(np.vstack([weighting_matrix(baseline, plan), weights]), plan)
+
+    masks = algorithm.compute_criteria_masks(land_data, animal_data, plan)
+    n_animals, n_locations = masks.shape
+    k = min(k, n_locations)
+
+    # Locations per animal and criteria pattern, shared by every weighting
+    n_patterns = pattern_scores.shape[1]
+    pattern_counts = pattern_histogram(masks, n_patterns)
+
+    location_ids = land_data["location_id"].to_numpy()
+    location_names = land_data["location_name"].to_numpy()
+    rankings, stability = [], []
+    for w, table in enumerate(pattern_scores):
+        n_levels, level_of_pattern = _pattern_levels(table)
+        level_counts = _level_counts(pattern_counts, level_of_pattern, n_levels)
+        ranks = _average_ranks(level_counts)[:, level_of_pattern]
+        top = _top_k_levels(masks, level_of_pattern, level_counts, k)
+        if w == 0:
+            baseline_ranks, baseline_top = ranks, top
+            continue
+
+        top_scores = table[np.take_along_axis(masks, top, axis=1)]
+        rankings.append(pd.DataFrame({
+            "weighting": w - 1,
+            "animal_id": np.repeat(animal_data["animal_id"].to_numpy(), k),
+            "animal_name": np.repeat(animal_data["animal_name"].to_numpy(), k),
+            "rank": np.tile(np.arange(1, k + 1), n_animals),
+            "location_id": location_ids[top.ravel()],
+            "location_name": location_names[top.ravel()],
+            "match_percentage": top_scores.ravel().round(2)
+        }))
+
+        overlap = (top[:, :, None] == baseline_top[:, None, :]).any(axis=2).sum(axis=1) / max(k, 1)
+        spearman = _weighted_correlation(ranks, baseline_ranks, pattern_counts)
+        stability.append({
+            "weighting": w - 1,
+            **dict(zip(plan.names, weights[w - 1])),
+            "top1_agreement": np.mean(top[:, 0] == baseline_top[:, 0]) if k and n_animals else np.nan,
+            "topk_overlap": overlap.mean() if n_animals else np.nan,
+            "spearman": np.nanmean(spearman) if np.any(~np.isnan(spearman)) else np.nan
+        })
+
+    return pd.concat(rankings, ignore_index=True), pd.DataFrame(stability)
+
+def threshold_sweep(land_data, animal_data, criteria=None, masks=None):
+    """
+    Compute survival statistics for every threshold in one pass over the pairs.
+
+    A criteria set only has 2^C possible match percentages, so the histograms
+    of match percentages per species and per location hold everything any
+    threshold needs. The survival curve is evaluated at every distinct
+    rounded match percentage; between two of them nothing changes. Pairs
+    survive a threshold when their unrounded match percentage reaches it,
+    exactly like calculate_survival_match.
+
+    Parameters:
+    land_data (DataFrame): Land geographical data
+    animal_data (DataFrame): Animal survival condition data
+    criteria (list or CriteriaPlan): Criteria to check, None for the defaults
+    masks (ndarray): Precomputed criteria bitmasks, see algorithm.compute_criteria_masks
+
+    Returns:
+    ThresholdSweep: Histograms with one column per threshold, the curve
+    with threshold, surviving_pairs, survival_rate (%), species_with_habitat
+    and locations_with_species columns, and the number of pairs per criteria
+    pattern (see surviving_pairs)
+    """
+    plan = compile_criteria(criteria)
+    if plan.pattern_scores is None:
+        raise ValueError("Threshold sweeps support criteria sets with at most 16 criteria")
+    if masks is None:
+        masks = algorithm.compute_criteria_masks(land_data, animal_data, plan)
+    pattern_scores = plan.pattern_scores
+    n_animals, n_locations = masks.shape
+
+    # Histogram bins are the displayed (rounded) match percentages
+    thresholds, bin_of_pattern = np.unique(np.round(pattern_scores, 2), return_inverse=True)
+    n_bins = len(thresholds)
+
+    pattern_counts = pattern_histogram(masks, len(pattern_scores))
+    species_counts = np.zeros((n_animals, n_bins), dtype=np.int64)
+    np.add.at(species_counts.T, bin_of_pattern, pattern_counts.T)
+
+    # One pass over the rows fills the location histograms and best scores
+    location_counts = np.zeros(n_locations * n_bins, dtype=np.int64)
+    location_best = np.full(n_locations, -np.inf)
+    bin_offsets = np.arange(n_locations) * n_bins
+    for row_masks in masks:
+        location_counts[bin_offsets + bin_of_pattern[row_masks]] += 1
+        np.maximum(location_best, pattern_scores[row_masks], out=location_best)
+    location_counts = location_counts.reshape(n_locations, n_bins)
+
+    # Survivors per threshold from the unrounded pattern scores
+    survives = pattern_scores[None, :] >= thresholds[:, None]
+    pattern_totals = pattern_counts.sum(axis=0)
+    surviving_pairs = survives @ pattern_totals
+    species_best = np.array([pattern_scores[counts > 0].max(initial=-np.inf) for counts in pattern_counts])
+    n_pairs = n_animals * n_locations
+
+    curve = pd.DataFrame({
+        "threshold": thresholds,
+        "surviving_pairs": surviving_pairs,
+        "survival_rate": surviving_pairs / n_pairs * 100 if n_pairs else np.zeros(n_bins),
+        "species_with_habitat": (species_best[None, :] >= thresholds[:, None]).sum(axis=1),
+        "locations_with_species": (location_best[None, :] >= thresholds[:, None]).sum(axis=1)
+    })
+    species_histogram = pd.DataFrame(species_counts, index=animal_data["animal_name"].to_numpy(), columns=thresholds)
+    location_histogram = pd.DataFrame(location_counts, index=land_data["location_name"].to_numpy(), columns=thresholds)
+    return ThresholdSweep(thresholds, species_histogram, location_histogram, curve, pattern_totals)
+
+def surviving_pairs(sweep, threshold, criteria=None):
+    """Number of pairs whose unrounded match percentage reaches any threshold, from a ThresholdSweep."""
+    plan = compile_criteria(criteria)
+    return int(sweep.pattern_counts[plan.pattern_scores >= threshold].sum())
@@ -0,0 +1,232 @@
+import argparse
+import os
+
+import pandas as pd
+import numpy as np
+
+from datasets import dataset_format, save_dataset, write_chunks, write_manifest
+
+# Typical climate of each biome:
+# share of locations, mean temperature (c), mean rainfall (mm), mean elevation (m), base vegetation
+BIOMES = {
+    "Tropical Rainforest": (0.12, 26.0, 2800.0, 300.0, 0.85),
+    "Savanna": (0.12, 24.0, 900.0, 600.0, 0.45),
+    "Desert": (0.14, 28.0, 120.0, 500.0, 0.05),
+    "Grassland": (0.14, 12.0, 600.0, 700.0, 0.40),
+    "Temperate Forest": (0.14, 10.0, 1200.0, 500.0, 0.70),
+    "Boreal Forest": (0.10, -2.0, 600.0, 400.0, 0.60),
+    "Arctic Tundra": (0.08, -15.0, 250.0, 200.0, 0.15),
+    "Mountain Range": (0.08, 2.0, 1000.0, 3500.0, 0.30),
+    "Wetlands": (0.08, 15.0, 1600.0, 50.0, 0.65)
+}
+BIOME_NAMES = list(BIOMES)
+
+# Temperature drop per metre above the biome's typical elevation
+LAPSE_RATE_C_PER_M = 0.0065
+
+def order_ranges(animal_data):
+    """
+    Swap min_*/max_* values wherever min > max, in place and vectorized.
+
+    Parameters:
+    animal_data (DataFrame): Animal survival condition data
+
+    Returns:
+    DataFrame: The same frame, for chaining
+    """
+    for col in animal_data.columns:
+        if col.startswith('min_') and f'max_{col[4:]}' in animal_data.columns:
+            low = animal_data[col].to_numpy().copy()
+            high = animal_data[f'max_{col[4:]}'].to_numpy().copy()
+            # Only rows with min > max are swapped, a NaN bound leaves the other one as it is
+            swap = low > high
+            low[swap], high[swap] = high[swap], low[swap]
+            animal_data[col], animal_data[f'max_{col[4:]}'] = low, high
+    return animal_data
+
+def _biome_table():
+    """Biome parameters as arrays indexed by biome number."""
+    return {name: np.array(values) for name, values in zip(
+        ["share", "temperature", "rainfall", "elevation", "vegetation"], zip(*BIOMES.values())
+    )}
+
+def generate_locations(n_locations, seed=42, start_id=1):
+    """
+    Generate land data with the landdata.py schema and realistic correlations.
+
+    Every location belongs to a biome. Temperature falls with elevation,
+    humidity and water follow rainfall, and vegetation, soil quality and
+    predator density follow vegetation cover.
+
+    Parameters:
+    n_locations (int): Number of locations
+    seed (int): Random seed
+    start_id (int): location_id of the first row
+
+    Returns:
+    DataFrame: Land geographical data
+    """
+    rng = np.random.default_rng(seed)
+    biome = _biome_table()
+    biome_idx = rng.choice(len(BIOME_NAMES), size=n_locations, p=biome["share"] / biome["share"].sum())
+
+    elevation = np.maximum(0, rng.normal(biome["elevation"][biome_idx], 300 + biome["elevation"][biome_idx] * 0.3))
+    temperature = (rng.normal(biome["temperature"][biome_idx], 4)
+                   - LAPSE_RATE_C_PER_M * (elevation - biome["elevation"][biome_idx]))
+    rainfall = biome["rainfall"][biome_idx] * rng.lognormal(0, 0.35, n_locations)
+    wetness = np.clip(np.log1p(rainfall) / np.log1p(4000), 0, 1)
+    humidity = np.clip(10 + 80 * wetness + rng.normal(0, 8, n_locations), 10, 95)
+    vegetation = np.clip(0.6 * biome["vegetation"][biome_idx] + 0.4 * wetness + rng.normal(0, 0.08, n_locations), 0, 1)
+    water = np.clip(0.8 * wetness + rng.normal(0, 0.1, n_locations), 0, 1)
+    soil = np.clip(0.3 + 0.5 * vegetation + rng.normal(0, 0.12, n_locations), 0, 1)
+    predators = np.clip(0.7 * vegetation + rng.normal(0, 0.15, n_locations), 0, 1)
+
+    location_id = np.arange(start_id, start_id + n_locations)
+    location_name = [f"{BIOME_NAMES[b]} {i}" for b, i in zip(biome_idx.tolist(), location_id.tolist())]
+
+    return pd.DataFrame({
+        'location_id': location_id,
+        'location_name': location_name,
+        'avg_temperature_c': temperature.round(1),
+        'annual_rainfall_mm': np.clip(rainfall, 50, 4000).round(),
+        'elevation_m': np.minimum(elevation, 8000).round(),
+        'humidity_percent': humidity.round(1),
+        'vegetation_density': vegetation.round(2),
+        'water_availability': water.round(2),
+        'soil_quality': soil.round(2),
+        'predator_density': predators.round(2)
+    })
+
+def iter_locations(n_locations, chunk_size=1_000_000, seed=42):
+    """
+    Generate land data chunk by chunk.
+
+    Each chunk gets its own random stream derived from seed and the chunk
+    number, so the output is reproducible for a given seed and chunk size.
+
+    Yields:
+    DataFrame: Up to chunk_size consecutive locations
+    """
+    streams = np.random.SeedSequence(seed).spawn((n_locations + chunk_size - 1) // chunk_size)
+    for chunk, stream in enumerate(streams):
+        start = chunk * chunk_size
+        yield generate_locations(min(chunk_size, n_locations - start), seed=stream, start_id=start + 1)
+
+def generate_animals(n_animals, seed=43):
+    """
+    Generate animal survival conditions with the animaldata.py schema.
+
+    Every species is adapted to a home biome: its tolerance ranges are
+    centred on that biome's climate with a random breadth, so generalists and
+    specialists both occur. Inverted ranges are ordered with order_ranges.
+
+    Parameters:
+    n_animals (int): Number of species
+    seed (int): Random seed
+
+    Returns:
+    DataFrame: Animal survival condition data
+    """
+    rng = np.random.default_rng(seed)
+    biome = _biome_table()
+    biome_idx = rng.choice(len(BIOME_NAMES), size=n_animals, p=biome["share"] / biome["share"].sum())
+    breadth = rng.uniform(0.5, 2.0, n_animals)
+
+    def tolerance(center, spread, low, high, decimals):
+        """Random range around center, scaled by each species' breadth."""
+        half = spread * breadth * rng.uniform(0.5, 1.5, n_animals)
+        shift = rng.normal(0, spread * 0.3, n_animals)
+        return (np.clip(center + shift - half, low, high).round(decimals),
+                np.clip(center + shift + half, low, high).round(decimals))
+
+    wetness = np.log1p(biome["rainfall"][biome_idx]) / np.log1p(4000)
+    min_temp, max_temp = tolerance(biome["temperature"][biome_idx], 12, -50, 50, 1)
+    min_rain, max_rain = tolerance(biome["rainfall"][biome_idx], 800, 0, 5000, 0)
+    min_elev, max_elev = tolerance(biome["elevation"][biome_idx], 1200, 0, 6000, 0)
+    min_humid, max_humid = tolerance(10 + 80 * wetness, 25, 5, 100, 1)
+    min_veg, max_veg = tolerance(biome["vegetation"][biome_idx], 0.3, 0, 1, 2)
+    min_water, max_water = tolerance(0.8 * wetness, 0.3, 0, 1, 2)
+    min_soil, max_soil = tolerance(np.full(n_animals, 0.5), 0.3, 0, 1, 2)
+
+    animal_data = pd.DataFrame({
+        'animal_id': np.arange(1, n_animals + 1),
+        'animal_name': [f"{BIOME_NAMES[b]} species {i}" for i, b in enumerate(biome_idx.tolist(), start=1)],
+        'min_temperature_c': min_temp,
+        'max_temperature_c': max_temp,
+        'min_rainfall_mm': min_rain,
+        'max_rainfall_mm': max_rain,
+        'min_elevation_m': min_elev,
+        'max_elevation_m': max_elev,
+        'min_humidity_percent': min_humid,
+        'max_humidity_percent': max_humid,
+        'min_vegetation_density': min_veg,
+        'max_vegetation_density': max_veg,
+        'min_water_availability': min_water,
+        'max_water_availability': max_water,
+        'min_soil_quality': min_soil,
+        'max_soil_quality': max_soil,
+        'max_predator_density': rng.uniform(0.2, 1, n_animals).round(2)
+    })
+    return order_ranges(animal_data)
+
+def write_locations(path, n_locations, chunk_size=1_000_000, seed=42, format=None):
+    """
+    Generate land data straight to disk, one chunk at a time.
+
+    CSV (gzip-compressed for .csv.gz) and Parquet are written chunk by
+    chunk with datasets.write_chunks. The .npy column format
+    preallocates every column file and fills it through a memory map.
+
+    Parameters:
+    path (str): Output file or directory, see datasets.save_dataset
+    n_locations (int): Number of locations
+    chunk_size (int): Locations generated and held in memory at once
+    seed (int): Random seed
+    format (str): "csv", "parquet" or "npy", inferred from path when None
+    """
+    format = format or dataset_format(path)
+    chunks = iter_locations(n_locations, chunk_size, seed)
+
+    if format in ("csv", "parquet"):
+        write_chunks(chunks, path, format)
+    elif format == "npy":
+        _write_npy_columns(path, chunks, n_locations)
+    else:
+        raise ValueError(f"Unknown dataset format: {format}")
+
+def _write_npy_columns(path, chunks, n_rows):
+    """Fill preallocated, memory-mapped .npy column files from DataFrame chunks."""
+    os.makedirs(path, exist_ok=True)
+    name_width = max(len(name) for name in BIOME_NAMES) + 1 + len(str(n_rows))
+    columns = None
+    offset = 0
+    for chunk in chunks:
+        if columns is None:
+            columns = {}
+            for name in chunk.columns:
+                dtype = chunk[name].to_numpy().dtype
+                dtype = dtype if dtype.kind in "biuf" else np.dtype(f"<U{name_width}")
+                columns[name] = np.lib.format.open_memmap(
+                    os.path.join(path, f"{name}.npy"), mode="w+", dtype=dtype, shape=(n_rows,))
+        for name, column in columns.items():
+            column[offset:offset + len(chunk)] = chunk[name].to_numpy()
+        offset += len(chunk)
+
+    columns = columns or {}
+    for column in columns.values():
+        column.flush()
+    write_manifest(path, n_rows, [(name, column.dtype) for name, column in columns.items()])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic load-test datasets")
+    parser.add_argument("--animals", type=int, default=1_000, help="Number of species")
+    parser.add_argument("--locations", type=int, default=1_000_000, help="Number of locations")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="Locations generated at once")
+    parser.add_argument("--land-output", default="synthetic_land_data.csv")
+    parser.add_argument("--animal-output", default="synthetic_animal_data.csv")
+    parser.add_argument("--seed", type=int, default=42, help="Land seed, the animal seed is seed + 1")
+    args = parser.parse_args()
+
+    write_locations(args.land_output, args.locations, args.chunk_size, args.seed)
+    save_dataset(generate_animals(args.animals, args.seed + 1), args.animal_output)
+    print(f"Wrote {args.locations} locations to {args.land_output} and {args.animals} species to {args.animal_output}")